@@ -0,0 +1,257 @@
+import argparse
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+from pyproj import CRS, Transformer
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+from shapely.geometry import box
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.vector_io import write_vector
+
+"""
+This module generates synthetic rasters for benchmarking the raster tools without real data:
+
+- A land-cover GeoTIFF with the classes of the Sentinel-2 10 m land cover product, in patches a few hundred meters
+  across, so polygonizing it gives realistic shapes. Class 2 (trees) is the class parse_data and raster_mask extract.
+- A DEM GeoTIFF of rolling terrain with some noise, with slopes spread over all the slope classes of topo_processor.
+- An AOI covering the middle of the rasters, in its own CRS.
+
+Rasters are written in strips of rows, so a Sentinel-2 tile of 10980 x 10980 cells is generated without holding it
+in memory. The same seed gives the same files, so runs on different machines or commits measure the same work.
+"""
+
+SIZES = {  # Preset name: cells per side
+    'small': 1024,
+    'medium': 4096,
+    'sentinel2': 10980,
+}
+DEFAULT_CRS = 'EPSG:32633'
+DEFAULT_AOI_CRS = 'EPSG:4326'
+DEFAULT_SEED = 0
+LAND_COVER_CLASSES = np.array([1, 2, 4, 5, 7, 8, 9, 10, 11], dtype=np.uint8)
+LAND_COVER_WEIGHTS = np.array([0.10, 0.35, 0.02, 0.20, 0.15, 0.10, 0.02, 0.03, 0.03])
+LAND_COVER_NODATA = 0
+PATCH_CELLS = 32
+DEM_NODATA = -9999.0
+STRIP_ROWS = 512
+GTIFF_OPTIONS = {
+    'driver': 'GTiff',
+    'tiled': True,
+    'blockxsize': 256,
+    'blockysize': 256,
+    'compress': 'deflate',
+    'BIGTIFF': 'IF_SAFER',
+}
+
+
+def parse_size(size):
+    """
+    Converts a size preset or a number of cells to cells per side.
+
+    :param size: One of the SIZES, or a number of cells.
+    :return: The number of cells per side.
+    """
+    return SIZES[size] if size in SIZES else int(size)
+
+
+def default_pixel_size(crs):
+    """
+    Gets a cell size of about 10 meters in the units of a CRS.
+
+    :param crs: The CRS of the raster.
+    :return: The cell size.
+    """
+    crs = CRS.from_user_input(crs)
+    return 0.0001 if crs.is_geographic else 10.0 / crs.axis_info[0].unit_conversion_factor
+
+
+def raster_transform(size, crs, pixel_size=None):
+    """
+    Places a raster in the middle of the area of use of its CRS.
+
+    :param size: The number of cells per side.
+    :param crs: The CRS of the raster.
+    :param pixel_size: The cell size in the units of the CRS. Defaults to about 10 meters.
+    :return: The affine transform of the raster.
+    """
+    crs = CRS.from_user_input(crs)
+    pixel_size = pixel_size or default_pixel_size(crs)
+    west, south, east, north = crs.area_of_use.bounds
+    to_crs = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+    center_x, center_y = (round(value / pixel_size) * pixel_size
+                          for value in to_crs.transform((west + east) / 2, (south + north) / 2))
+    return from_origin(center_x - size * pixel_size / 2, center_y + size * pixel_size / 2, pixel_size, pixel_size)
+
+
+def raster_profile(size, crs, transform, dtype, nodata):
+    """
+    Builds the profile of a tiled, compressed single-band GeoTIFF.
+
+    :param size: The number of cells per side.
+    :param crs: The CRS of the raster.
+    :param transform: The affine transform of the raster.
+    :param dtype: The data type of the cells.
+    :param nodata: The NoData value.
+    :return: The rasterio profile.
+    """
+    return dict(GTIFF_OPTIONS, width=size, height=size, count=1, dtype=dtype, nodata=nodata, crs=crs,
+                transform=transform)
+
+
+def write_land_cover(path, size, crs=DEFAULT_CRS, pixel_size=None, seed=DEFAULT_SEED):
+    """
+    Writes a synthetic land-cover raster of square patches of random classes.
+
+    :param path: The path of the GeoTIFF to write.
+    :param size: The number of cells per side.
+    :param crs: The CRS of the raster.
+    :param pixel_size: The cell size in the units of the CRS. Defaults to about 10 meters.
+    :param seed: The seed of the random classes.
+    :return: The path of the GeoTIFF.
+    """
+    rng = np.random.default_rng(seed)
+    patches = -(-size // PATCH_CELLS)
+    patch_classes = rng.choice(LAND_COVER_CLASSES, size=(patches, patches), p=LAND_COVER_WEIGHTS)
+    patch_columns = np.arange(size) // PATCH_CELLS
+
+    profile = raster_profile(size, crs, raster_transform(size, crs, pixel_size), 'uint8', LAND_COVER_NODATA)
+    with rasterio.open(path, 'w', **profile) as dst:
+        for row_off in range(0, size, STRIP_ROWS):
+            rows = np.arange(row_off, min(row_off + STRIP_ROWS, size))
+            strip = patch_classes[(rows // PATCH_CELLS)[:, None], patch_columns[None, :]]
+            dst.write(strip, 1, window=Window(0, row_off, size, len(rows)))
+    return path
+
+
+def write_dem(path, size, crs=DEFAULT_CRS, pixel_size=None, seed=DEFAULT_SEED):
+    """
+    Writes a synthetic DEM of rolling hills with some noise, in meters.
+
+    :param path: The path of the GeoTIFF to write.
+    :param size: The number of cells per side.
+    :param crs: The CRS of the raster.
+    :param pixel_size: The cell size in the units of the CRS. Defaults to about 10 meters.
+    :param seed: The seed of the noise.
+    :return: The path of the GeoTIFF.
+    """
+    rng = np.random.default_rng(seed)
+    # Hills of several wavelengths, in cells, with heights in meters that give slopes from flat to over 20 percent
+    waves = [(wavelength, rng.uniform(0, 2 * np.pi, 2), height)
+             for wavelength, height in [(2000, 300.0), (600, 150.0), (150, 40.0)]]
+    columns = np.arange(size)
+
+    profile = raster_profile(size, crs, raster_transform(size, crs, pixel_size), 'float32', DEM_NODATA)
+    with rasterio.open(path, 'w', **profile) as dst:
+        for strip_index, row_off in enumerate(range(0, size, STRIP_ROWS)):
+            rows = np.arange(row_off, min(row_off + STRIP_ROWS, size))
+            strip = np.full((len(rows), size), 1000.0)
+            for wavelength, (phase_x, phase_y), height in waves:
+                strip += height * np.outer(np.sin(2 * np.pi * rows / wavelength + phase_y),
+                                           np.cos(2 * np.pi * columns / wavelength + phase_x))
+            strip += np.random.default_rng([seed, strip_index]).normal(0, 0.2, strip.shape)
+            dst.write(strip.astype(np.float32), 1, window=Window(0, row_off, size, len(rows)))
+    return path
+
+
+def write_aoi(path, raster_path, fraction=0.5, crs=DEFAULT_AOI_CRS):
+    """
+    Writes an AOI covering the middle of a raster.
+
+    :param path: The path of the vector file to write.
+    :param raster_path: The raster to place the AOI on.
+    :param fraction: The share of the raster's width and height the AOI covers.
+    :param crs: The CRS of the AOI.
+    :return: The path of the vector file.
+    """
+    with rasterio.open(raster_path) as src:
+        left, bottom, right, top = src.bounds
+        raster_crs = src.crs
+    margin_x, margin_y = (right - left) * (1 - fraction) / 2, (top - bottom) * (1 - fraction) / 2
+    aoi = gpd.GeoDataFrame({'name': ['benchmark']},
+                           geometry=[box(left + margin_x, bottom + margin_y, right - margin_x, top - margin_y)],
+                           crs=raster_crs)
+    if os.path.exists(path):
+        os.remove(path)
+    write_vector(aoi.to_crs(crs), path)
+    return path
+
+
+def crs_name(crs):
+    """
+    Gets a name for a CRS that can be used in a file name.
+
+    :param crs: The CRS.
+    :return: The name, like EPSG32633.
+    """
+    return CRS.from_user_input(crs).to_string().replace(':', '')
+
+
+def fixture_paths(fixtures_dir, size, crs=DEFAULT_CRS, pixel_size=None, seed=DEFAULT_SEED, aoi_crs=DEFAULT_AOI_CRS):
+    """
+    Gets the paths of the fixtures generated with some settings. Every setting is part of the folder name, so fixtures
+    generated with another seed, cell size or AOI CRS are never reused for these settings.
+
+    :param fixtures_dir: The folder holding the fixtures.
+    :param size: The number of cells per side.
+    :param crs: The CRS of the rasters.
+    :param pixel_size: The cell size in the units of the CRS. Defaults to about 10 meters.
+    :param seed: The seed of the random values.
+    :param aoi_crs: The CRS of the AOI.
+    :return: A dictionary with the paths of the 'land_cover' and 'dem' rasters and of the 'aoi'. Each raster is
+             alone in its folder, as the tools take a folder of rasters.
+    """
+    pixel_size = pixel_size or default_pixel_size(crs)
+    folder = os.path.join(fixtures_dir,
+                          f"{size}_{crs_name(crs)}_px{pixel_size:g}_seed{seed}_aoi{crs_name(aoi_crs)}")
+    return {
+        'land_cover': os.path.join(folder, 'land_cover', "land_cover.tif"),
+        'dem': os.path.join(folder, 'dem', "dem.tif"),
+        'aoi': os.path.join(folder, "aoi.gpkg"),
+    }
+
+
+def make_fixtures(fixtures_dir, size, crs=DEFAULT_CRS, pixel_size=None, seed=DEFAULT_SEED, aoi_crs=DEFAULT_AOI_CRS,
+                  force=False):
+    """
+    Generates the land-cover raster, DEM and AOI of some settings, reusing those already generated with the same
+    settings.
+
+    :param fixtures_dir: The folder to write the fixtures in.
+    :param size: The number of cells per side.
+    :param crs: The CRS of the rasters.
+    :param pixel_size: The cell size in the units of the CRS. Defaults to about 10 meters.
+    :param seed: The seed of the random values.
+    :param aoi_crs: The CRS of the AOI.
+    :param force: Whether to regenerate fixtures that already exist.
+    :return: The paths of the fixtures, as returned by fixture_paths.
+    """
+    paths = fixture_paths(fixtures_dir, size, crs, pixel_size, seed, aoi_crs)
+    writers = {'land_cover': write_land_cover, 'dem': write_dem}
+    for name, writer in writers.items():
+        if force or not os.path.exists(paths[name]):
+            os.makedirs(os.path.dirname(paths[name]), exist_ok=True)
+            print(f"Generating {paths[name]}.")
+            writer(paths[name], size, crs, pixel_size, seed)
+    if force or not os.path.exists(paths['aoi']):
+        write_aoi(paths['aoi'], paths['land_cover'], crs=aoi_crs)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic land-cover, DEM and AOI fixtures")
+    parser.add_argument('fixtures_dir', metavar='fixtures_dir', type=str, help='folder to write the fixtures in')
+    parser.add_argument('--size', metavar='size', type=str, default='small', help=f'cells per side, or one of {", ".join(f"{name} ({cells})" for name, cells in SIZES.items())}')
+    parser.add_argument('--crs', metavar='crs', type=str, default=DEFAULT_CRS, help='CRS of the rasters')
+    parser.add_argument('--pixel_size', metavar='pixel_size', type=float, help='cell size in CRS units, about 10 meters by default')
+    parser.add_argument('--aoi_crs', metavar='aoi_crs', type=str, default=DEFAULT_AOI_CRS, help='CRS of the AOI')
+    parser.add_argument('--seed', metavar='seed', type=int, default=DEFAULT_SEED, help='seed of the random values')
+    parser.add_argument('--force', action='store_true', help='regenerate fixtures that already exist')
+    args = parser.parse_args()
+
+    make_fixtures(args.fixtures_dir, parse_size(args.size), args.crs, args.pixel_size, args.seed, args.aoi_crs,
+                  args.force)
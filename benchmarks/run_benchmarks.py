@@ -0,0 +1,436 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import rasterio
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tools import their sibling modules by name, so each tool's folder goes on the path too
+for folder in ['', 'sentinel2', 'raster_histogram', 'topo_processor']:
+    sys.path.insert(0, os.path.join(REPO_ROOT, folder))
+from common.profiling import peak_rss_mb
+from fixtures import DEFAULT_AOI_CRS, DEFAULT_CRS, DEFAULT_SEED, SIZES, default_pixel_size, make_fixtures, parse_size
+
+"""
+This script benchmarks the core functions of parse_data, raster_mask, raster_histo and slope_engine on the synthetic
+rasters of fixtures.py, so their speed can be measured and compared without real data.
+
+Each case runs in a fresh process, so its peak resident memory is its own; that of the worker processes of the
+parallel cases is recorded separately. The inputs a case needs that another case makes, such as the slope grid
+reclassify times, are made before the clock starts, or reused from an earlier case of the same run. Every case
+records its wall and CPU time, its throughput in megapixels per second of input and the peak memory of its process.
+
+Each run is appended to a JSON history with the commit and machine it ran on, and compared with the last run of the
+same cases, size, CRS and workers on the same machine. Cases slower than the threshold are reported as regressions.
+The slope cases run once with one process and once with --workers processes, which shows whether the parallel mode
+helps on the machine.
+"""
+
+DEFAULT_FIXTURES_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'fixtures')
+DEFAULT_HISTORY = os.path.join(REPO_ROOT, 'benchmarks', 'history.json')
+DEFAULT_THRESHOLD = 0.10
+SLOPE_RECLASS_REMAP = "0 3 1;3 5 2;5 7 3;7 10 4;10 15 5;15 20 6;20 999.999990 7"
+
+
+def pixel_count(raster_path):
+    """
+    Gets the number of cells of a raster.
+
+    :param raster_path: The path to the raster.
+    :return: The number of cells.
+    """
+    with rasterio.open(raster_path) as src:
+        return src.width * src.height
+
+
+def intermediate(path, make):
+    """
+    Gets an input made by an earlier step, making it when this run has not made it yet.
+
+    :param path: The path of the input.
+    :param make: A function making the input at path.
+    :return: The path of the input.
+    """
+    if not os.path.exists(path):
+        make()
+    return path
+
+
+def reprojected_land_cover(paths, work_dir):
+    """
+    Gets the land-cover raster reprojected to the CRS of the AOI by raster_mask.
+    """
+    import raster_mask
+    aoi_crs = raster_mask.read_aoi(paths['aoi']).crs.to_string()
+    return intermediate(os.path.join(work_dir, 'land_cover_reprojected.tif'),
+                        lambda: raster_mask.reproject_raster_to_match_aoi(paths['land_cover'], aoi_crs, work_dir))
+
+
+def masked_land_cover(paths, work_dir):
+    """
+    Gets the reprojected land-cover raster masked with the AOI by raster_mask.
+    """
+    import raster_mask
+    aoi = raster_mask.read_aoi(paths['aoi'])
+    reprojected = reprojected_land_cover(paths, work_dir)
+    return intermediate(os.path.join(work_dir, 'land_cover_reprojected_masked.tif'),
+                        lambda: raster_mask.mask_raster_with_aoi(reprojected, aoi, work_dir))
+
+
+def slope_grid(paths, work_dir):
+    """
+    Gets the slope grid of the DEM computed by slope_engine.
+    """
+    from slope_engine import compute_slope
+    slope_path = os.path.join(work_dir, 'slope.tif')
+    return intermediate(slope_path, lambda: compute_slope(paths['dem'], slope_path))
+
+
+def reclassified_slope(paths, work_dir):
+    """
+    Gets the slope grid reclassified into the slope classes of topo_processor by slope_engine.
+    """
+    from slope_engine import reclassify_slope
+    slope = slope_grid(paths, work_dir)
+    reclass_path = os.path.join(work_dir, 'slope_reclass.tif')
+    return intermediate(reclass_path, lambda: reclassify_slope(slope, reclass_path, SLOPE_RECLASS_REMAP))
+
+
+def aspect_grid(paths, work_dir, workers):
+    """
+    Gets the aspect grid of the DEM computed by slope_engine, the input of raster_histo.
+    """
+    from slope_engine import compute_aspect
+    aspect_path = os.path.join(work_dir, 'aspect.tif')
+    return intermediate(aspect_path, lambda: compute_aspect(paths['dem'], aspect_path, workers=workers))
+
+
+# Each case takes the fixture paths, the run's work folder and the number of workers, makes the inputs it needs, and
+# returns the function to time with the number of input cells it processes
+def case_parse_data_extract(paths, work_dir, workers):
+    import parse_data
+    folder, name = os.path.split(paths['land_cover'])
+    return (lambda: parse_data.extract_values_and_create_new_raster(folder, work_dir, [name], [2]),
+            pixel_count(paths['land_cover']))
+
+
+def case_raster_mask_reproject(paths, work_dir, workers):
+    import raster_mask
+    aoi_crs = raster_mask.read_aoi(paths['aoi']).crs.to_string()
+    return (lambda: raster_mask.reproject_raster_to_match_aoi(paths['land_cover'], aoi_crs, work_dir),
+            pixel_count(paths['land_cover']))
+
+
+def case_raster_mask_mask(paths, work_dir, workers):
+    import raster_mask
+    aoi = raster_mask.read_aoi(paths['aoi'])
+    reprojected = reprojected_land_cover(paths, work_dir)
+    return lambda: raster_mask.mask_raster_with_aoi(reprojected, aoi, work_dir), pixel_count(reprojected)
+
+
+def case_raster_mask_polygonize(paths, work_dir, workers):
+    import raster_mask
+    masked = masked_land_cover(paths, work_dir)
+    return lambda: raster_mask.raster_to_polygons(masked, work_dir), pixel_count(masked)
+
+
+def case_raster_histo_counts(paths, work_dir, workers):
+    import raster_histo
+    aspect = aspect_grid(paths, work_dir, workers)
+    return lambda: raster_histo.raster_category_counts(aspect), pixel_count(aspect)
+
+
+def case_slope(paths, work_dir, workers):
+    from slope_engine import compute_slope
+    return (lambda: compute_slope(paths['dem'], os.path.join(work_dir, 'slope.tif')),
+            pixel_count(paths['dem']))
+
+
+def case_slope_parallel(paths, work_dir, workers):
+    from slope_engine import compute_slope
+    return (lambda: compute_slope(paths['dem'], os.path.join(work_dir, 'slope_parallel.tif'), workers=workers),
+            pixel_count(paths['dem']))
+
+
+def case_reclassify(paths, work_dir, workers):
+    from slope_engine import reclassify_slope
+    slope = slope_grid(paths, work_dir)
+    return (lambda: reclassify_slope(slope, os.path.join(work_dir, 'slope_reclass.tif'), SLOPE_RECLASS_REMAP),
+            pixel_count(slope))
+
+
+def case_class_areas(paths, work_dir, workers):
+    from slope_engine import class_area_summary
+    reclass = reclassified_slope(paths, work_dir)
+    return lambda: class_area_summary(reclass, {}), pixel_count(reclass)
+
+
+CASES = {
+    'parse_data.extract': case_parse_data_extract,
+    'raster_mask.reproject': case_raster_mask_reproject,
+    'raster_mask.mask': case_raster_mask_mask,
+    'raster_mask.polygonize': case_raster_mask_polygonize,
+    'raster_histo.counts': case_raster_histo_counts,
+    'slope_engine.slope': case_slope,
+    'slope_engine.slope_parallel': case_slope_parallel,
+    'slope_engine.reclassify': case_reclassify,
+    'slope_engine.class_areas': case_class_areas,
+}
+
+
+def run_case(name, paths, work_dir, workers):
+    """
+    Runs one case and measures it. Runs in a fresh worker process.
+
+    :param name: The name of the case, one of CASES.
+    :param paths: The fixture paths.
+    :param work_dir: The folder for the outputs of the run.
+    :param workers: The number of worker processes for the parallel cases.
+    :return: The measurements of the case, or the reason it was skipped when a tool's dependency is missing.
+    """
+    try:
+        run, pixels = CASES[name](paths, work_dir, workers)
+    except ImportError as e:
+        return {'case': name, 'skipped': str(e)}
+
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    run()
+    wall = time.perf_counter() - start_wall
+    return {
+        'case': name,
+        'wall_seconds': round(wall, 4),
+        'cpu_seconds': round(time.process_time() - start_cpu, 4),
+        'pixels': pixels,
+        'megapixels_per_second': round(pixels / 1_000_000 / wall, 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'children_peak_rss_mb': peak_rss_mb('children'),
+    }
+
+
+def run_cases(names, paths, work_dir, workers=1, repeat=1):
+    """
+    Runs cases one after another, each in a fresh process, keeping the fastest of the repeats of each.
+
+    :param names: The names of the cases.
+    :param paths: The fixture paths.
+    :param work_dir: The folder for the outputs of the run.
+    :param workers: The number of worker processes for the parallel cases.
+    :param repeat: The number of times each case runs.
+    :return: A list of the measurements of each case.
+    """
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name in names:
+        best = None
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    result = executor.submit(run_case, name, paths, work_dir, workers).result()
+                except Exception as e:
+                    result = {'case': name, 'error': f"{type(e).__name__}: {e}"}
+            if 'wall_seconds' not in result or best is None or result['wall_seconds'] < best['wall_seconds']:
+                best = result
+            if 'wall_seconds' not in result:
+                break
+        print(format_result(best))
+        results.append(best)
+    return results
+
+
+def git_commit():
+    """
+    Gets the commit the benchmarks run on.
+
+    :return: The short commit hash, with a '+' when the tree has uncommitted changes, or None outside a git repo.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+' if dirty else '')
+
+
+def load_history(history_path):
+    """
+    Loads the benchmark history.
+
+    :param history_path: The path of the history file.
+    :return: A list of runs, oldest first.
+    """
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as f:
+        return json.load(f)
+
+
+def save_history(history_path, history):
+    """
+    Saves the benchmark history, replacing the file only once it is fully written.
+
+    :param history_path: The path of the history file.
+    :param history: The list of runs.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    temporary_path = f"{history_path}.tmp"
+    with open(temporary_path, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(temporary_path, history_path)
+
+
+def previous_run(history, run):
+    """
+    Finds the last run comparable with a run: same fixtures (size, CRS, cell size, seed and AOI CRS), workers and
+    machine.
+
+    :param history: The earlier runs, oldest first.
+    :param run: The run to compare.
+    :return: The comparable run, or None.
+    """
+    keys = ['size', 'crs', 'pixel_size', 'seed', 'aoi_crs', 'workers', 'machine']
+    for earlier in reversed(history):
+        if all(earlier.get(key) == run[key] for key in keys):
+            return earlier
+    return None
+
+
+def compare_runs(run, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares the wall time of each case of a run with a baseline run.
+
+    :param run: The new run.
+    :param baseline: The earlier run.
+    :param threshold: The relative slowdown reported as a regression.
+    :return: A list of (case, baseline wall seconds, wall seconds, relative change, regression) tuples.
+    """
+    baseline_results = {result['case']: result for result in baseline['results'] if 'wall_seconds' in result}
+    comparison = []
+    for result in run['results']:
+        if 'wall_seconds' not in result or result['case'] not in baseline_results:
+            continue
+        before = baseline_results[result['case']]['wall_seconds']
+        change = result['wall_seconds'] / before - 1 if before > 0 else 0.0
+        comparison.append((result['case'], before, result['wall_seconds'], change, change > threshold))
+    return comparison
+
+
+def format_result(result):
+    """
+    Formats the measurements of a case as one line.
+
+    :param result: The measurements returned by run_case.
+    :return: The line.
+    """
+    if 'skipped' in result:
+        return f"{result['case']:<28} skipped: {result['skipped']}"
+    if 'error' in result:
+        return f"{result['case']:<28} failed: {result['error']}"
+    return (f"{result['case']:<28} {result['wall_seconds']:>9.3f} s {result['megapixels_per_second']:>9.2f} Mpx/s "
+            f"{result['peak_rss_mb']:>8} MB")
+
+
+def main(fixtures_dir, size, crs=DEFAULT_CRS, aoi_crs=DEFAULT_AOI_CRS, seed=DEFAULT_SEED, pixel_size=None, cases=None,
+         workers=None, repeat=1, history_path=DEFAULT_HISTORY, threshold=DEFAULT_THRESHOLD, work_dir=None):
+    """
+    Generates or reuses the fixtures of some settings, runs the cases on them, records the run in the history and
+    compares it with the last comparable run.
+
+    :param fixtures_dir: The folder holding the fixtures.
+    :param size: The number of cells per side of the rasters.
+    :param crs: The CRS of the rasters.
+    :param aoi_crs: The CRS of the AOI.
+    :param seed: The seed of the fixtures.
+    :param pixel_size: The cell size of the rasters in the units of the CRS. Defaults to about 10 meters.
+    :param cases: The names of the cases to run. Defaults to all of them.
+    :param workers: The number of worker processes for the parallel cases. Defaults to the number of CPUs.
+    :param repeat: The number of times each case runs, keeping the fastest.
+    :param history_path: The path of the history file.
+    :param threshold: The relative slowdown reported as a regression.
+    :param work_dir: The folder for the outputs of the run, which is kept. Defaults to a temporary folder next to
+                     the fixtures, deleted after the run.
+    :return: The number of regressions.
+    """
+    cases = cases or list(CASES)
+    unknown = [name for name in cases if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown cases {unknown}, expected some of {list(CASES)}")
+    workers = workers or os.cpu_count()
+
+    pixel_size = pixel_size or default_pixel_size(crs)
+    paths = make_fixtures(fixtures_dir, size, crs, pixel_size, seed, aoi_crs)
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    keep_outputs = work_dir is not None
+    if keep_outputs:
+        os.makedirs(work_dir, exist_ok=True)
+    else:
+        work_dir = tempfile.mkdtemp(prefix='run_', dir=fixtures_dir)
+
+    print(f"Running {len(cases)} cases on {size} x {size} cells in {crs} with {workers} workers.")
+    run = {
+        'started': started,
+        'commit': git_commit(),
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'size': size,
+        'crs': crs,
+        'pixel_size': pixel_size,
+        'aoi_crs': aoi_crs,
+        'seed': seed,
+        'workers': workers,
+        'repeat': repeat,
+    }
+    try:
+        run['results'] = run_cases(cases, paths, work_dir, workers, repeat)
+    finally:
+        if not keep_outputs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    history = load_history(history_path)
+    baseline = previous_run(history, run)
+    history.append(run)
+    save_history(history_path, history)
+
+    regressions = 0
+    if baseline is not None:
+        print(f"Compared with the run of {baseline['started']} at commit {baseline['commit']}:")
+        for case, before, after, change, regression in compare_runs(run, baseline, threshold):
+            regressions += regression
+            flag = '  REGRESSION' if regression else ''
+            print(f"{case:<28} {before:>9.3f} s -> {after:>9.3f} s {change:>+8.1%}{flag}")
+    print(f"Saved the run to {history_path}.")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the raster tools on synthetic rasters")
+    parser.add_argument('--fixtures_dir', metavar='fixtures_dir', type=str, default=DEFAULT_FIXTURES_DIR, help='folder holding the fixtures, generated when missing')
+    parser.add_argument('--size', metavar='size', type=str, default='small', help=f'cells per side, or one of {", ".join(f"{name} ({cells})" for name, cells in SIZES.items())}')
+    parser.add_argument('--crs', metavar='crs', type=str, default=DEFAULT_CRS, help='CRS of the rasters')
+    parser.add_argument('--aoi_crs', metavar='aoi_crs', type=str, default=DEFAULT_AOI_CRS, help='CRS of the AOI')
+    parser.add_argument('--seed', metavar='seed', type=int, default=DEFAULT_SEED, help='seed of the fixtures')
+    parser.add_argument('--pixel_size', metavar='pixel_size', type=float, help='cell size in CRS units, about 10 meters by default')
+    parser.add_argument('--cases', metavar='cases', type=str, nargs='+', choices=list(CASES), help='cases to run, all by default')
+    parser.add_argument('--workers', metavar='workers', type=int, help='worker processes for the parallel cases, the number of CPUs by default')
+    parser.add_argument('--repeat', metavar='repeat', type=int, default=1, help='runs of each case, keeping the fastest')
+    parser.add_argument('--history', metavar='history', type=str, default=DEFAULT_HISTORY, help='JSON file the runs are recorded in')
+    parser.add_argument('--threshold', metavar='threshold', type=float, default=DEFAULT_THRESHOLD, help='relative slowdown reported as a regression')
+    parser.add_argument('--work_dir', metavar='work_dir', type=str, help='folder to keep the outputs of the run in, a temporary folder by default')
+    parser.add_argument('--check', action='store_true', help='exit with an error when a case regressed')
+    args = parser.parse_args()
+
+    regressions = main(args.fixtures_dir, parse_size(args.size), args.crs, args.aoi_crs, args.seed, args.pixel_size,
+                       args.cases, args.workers, args.repeat, args.history, args.threshold, args.work_dir)
+    if args.check and regressions:
+        sys.exit(1)
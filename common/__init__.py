@@ -0,0 +1,4 @@
+"""
+Shared helpers for the scripts in this repository. The scripts are run directly rather than installed, so each one
+puts the repository root on sys.path before importing from this package.
+"""
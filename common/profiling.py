@@ -0,0 +1,199 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+"""
+This module gives every script the same stage timing and profiling hooks, so their numbers can be compared.
+
+Scripts mark their stages with the stage context manager or the profiled decorator, and can count the rows, pixels
+or other units each stage processes. Stages cost nothing while profiling is off. A script's --profile flag (added by
+add_profile_argument) wraps its run in profiling(), which records each stage's wall and CPU time, its throughput
+and its memory, runs cProfile over the whole run, and writes:
+
+- <prefix>.prof: the cProfile statistics, readable with pstats or snakeviz.
+- <prefix>_stages.json: the stage report.
+
+The operating system only reports the peak resident memory of the whole process so far, so each stage records how
+much it raised that peak (rss_growth_mb), which shows the stages that needed more memory than any before them, and
+the peak so far when it ended (process_peak_rss_mb), which never goes down.
+
+Only stages run in the profiled process are recorded; work done in worker processes shows up in the peak memory of
+children and in the wall time of the stage that waits for it.
+"""
+
+DEFAULT_PREFIX = "profile"
+THROUGHPUT_UNITS = {  # Counter name: (throughput name, scale)
+    'rows': ('rows_per_second', 1),
+    'pixels': ('megapixels_per_second', 1_000_000),
+    'features': ('features_per_second', 1),
+    'requests': ('requests_per_second', 1),
+}
+
+_stages = None
+_depth = 0
+
+
+class Stage:
+    """
+    The counters of a running stage. Counters added several times are summed.
+    """
+
+    def __init__(self, name, counters):
+        self.name = name
+        self.counters = dict(counters)
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+def peak_rss_mb(who='self'):
+    """
+    Gets the peak resident memory of this process or of its finished child processes.
+
+    :param who: 'self' or 'children'.
+    :return: The peak resident memory in megabytes, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+@contextmanager
+def stage(name, **counters):
+    """
+    Marks a stage of a script. While profiling, its time, memory, counters and throughput are recorded.
+
+    :param name: The name of the stage.
+    :param counters: Initial counts of the units the stage processes, e.g. rows or pixels.
+    :return: A Stage whose add method counts more units.
+    """
+    global _depth
+    current = Stage(name, counters)
+    if _stages is None:
+        yield current
+        return
+
+    # Reserve the stage's place so nested stages are listed after it
+    index = len(_stages)
+    _stages.append(None)
+    start_wall, start_cpu, start_peak = time.perf_counter(), time.process_time(), peak_rss_mb()
+    _depth += 1
+    try:
+        yield current
+    finally:
+        _depth -= 1
+        wall = time.perf_counter() - start_wall
+        end_peak = peak_rss_mb()
+        record = {
+            'stage': name,
+            'depth': _depth,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(time.process_time() - start_cpu, 4),
+            'rss_growth_mb': None if end_peak is None else round(end_peak - start_peak, 1),
+            'process_peak_rss_mb': end_peak,
+        }
+        record.update(current.counters)
+        for counter, (throughput, scale) in THROUGHPUT_UNITS.items():
+            if counter in current.counters and wall > 0:
+                record[throughput] = round(current.counters[counter] / scale / wall, 3)
+        _stages[index] = record
+
+
+def profiled(name=None):
+    """
+    Decorates a function so each call is a stage.
+
+    :param name: The name of the stage. Defaults to the function's name.
+    :return: The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profiling(prefix, tool=None):
+    """
+    Profiles a run of a script when a prefix is given, and does nothing otherwise.
+
+    :param prefix: The path prefix of the report files, or None to not profile.
+    :param tool: The name of the script, recorded in the report.
+    """
+    global _stages
+    if prefix is None:
+        yield
+        return
+
+    _stages = []
+    profiler = cProfile.Profile()
+    start_wall = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - start_wall
+        stages, _stages = _stages, None
+
+        directory = os.path.dirname(os.path.abspath(prefix))
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(f"{prefix}.prof")
+        report = {
+            'tool': tool or os.path.basename(sys.argv[0]),
+            'argv': sys.argv[1:],
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - wall)),
+            'wall_seconds': round(wall, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'children_peak_rss_mb': peak_rss_mb('children'),
+            'stages': stages,
+        }
+        with open(f"{prefix}_stages.json", 'w') as f:
+            json.dump(report, f, indent=2)
+
+        print_report(report)
+        pstats.Stats(f"{prefix}.prof").sort_stats('cumulative').print_stats(15)
+        print(f"Wrote {prefix}.prof and {prefix}_stages.json")
+
+
+def print_report(report):
+    """
+    Prints a stage report as a table.
+
+    :param report: The report written by profiling.
+    """
+    print(f"{report['tool']}: {report['wall_seconds']:.2f} s, peak RSS {report['peak_rss_mb']} MB")
+    for record in report['stages']:
+        extras = {key: value for key, value in record.items()
+                  if key not in ('stage', 'depth', 'wall_seconds', 'cpu_seconds', 'rss_growth_mb', 'process_peak_rss_mb')}
+        extras = ', '.join(f"{key}={value:,}" if isinstance(value, int) else f"{key}={value}"
+                           for key, value in extras.items())
+        print(f"  {'  ' * record['depth']}{record['stage']}: {record['wall_seconds']:.3f} s wall, "
+              f"{record['cpu_seconds']:.3f} s CPU, peak RSS +{record['rss_growth_mb']} MB "
+              f"(process peak {record['process_peak_rss_mb']} MB) {extras}")
+
+
+def add_profile_argument(parser):
+    """
+    Adds the --profile flag to a script's argument parser.
+
+    :param parser: The ArgumentParser.
+    """
+    parser.add_argument('--profile', metavar='prefix', nargs='?', const=DEFAULT_PREFIX, default=None,
+                        help=f"profile the run, writing <prefix>.prof and <prefix>_stages.json (prefix defaults to {DEFAULT_PREFIX})")
@@ -0,0 +1,125 @@
+import json
+import os
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+import pyogrio
+from pyproj import CRS
+
+"""
+This module reads and writes the vector files of every script through the same fast path.
+
+Files are read and written by GDAL through pyogrio with Arrow batches, instead of feature by feature. The format is
+chosen from the file extension:
+
+- .gpkg: GeoPackage, the default output format. One file, no field name limit and no 2 GB limit.
+- .fgb: FlatGeobuf, a streaming format with a spatial index.
+- .parquet or .geoparquet: GeoParquet, read and written through pyarrow. Files are written with a bbox column, so
+  reads limited to an extent skip the row groups outside it.
+- .shp: shapefiles, still read and written for compatibility.
+
+Reads can be limited to some columns and to an extent, which GDAL and pyarrow apply while reading.
+"""
+
+FORMATS = {  # Format name: (extension, GDAL driver)
+    'gpkg': ('.gpkg', 'GPKG'),
+    'fgb': ('.fgb', 'FlatGeobuf'),
+    'parquet': ('.parquet', None),
+    'shp': ('.shp', 'ESRI Shapefile'),
+}
+DEFAULT_FORMAT = 'gpkg'
+PARQUET_EXTENSIONS = ('.parquet', '.geoparquet')
+GEOPARQUET_DEFAULT_CRS = 'OGC:CRS84'
+
+
+def is_parquet(path):
+    """
+    Checks whether a path is a GeoParquet file, from its extension.
+
+    :param path: The path of the file.
+    :return: True for .parquet and .geoparquet files.
+    """
+    return os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+
+
+def output_path(folder, name, output_format=DEFAULT_FORMAT):
+    """
+    Builds the path of an output file in a format.
+
+    :param folder: The output folder.
+    :param name: The file name without extension.
+    :param output_format: One of the FORMATS.
+    :return: The path of the file.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {list(FORMATS)}")
+    return os.path.join(folder, name + FORMATS[output_format][0])
+
+
+def read_vector(path, columns=None, bbox=None, layer=None):
+    """
+    Reads a vector file into a GeoDataFrame.
+
+    :param path: The path of the file. Its extension selects the format.
+    :param columns: The attribute columns to read. None reads all of them, and an empty list only the geometry.
+    :param bbox: Optional (minx, miny, maxx, maxy) tuple in the file's CRS, or GeoDataFrame or GeoSeries whose
+                 extent is reprojected to the file's CRS, limiting the features read to those whose extent meets it.
+    :param layer: The layer to read from a GeoPackage.
+    :return: A GeoDataFrame containing the file's features.
+    """
+    if not is_parquet(path):
+        return gpd.read_file(path, layer=layer, columns=columns, bbox=bbox, engine='pyogrio', use_arrow=True)
+
+    geo = json.loads(pq.read_schema(path).metadata[b'geo'])
+    geometry = geo['columns'][geo['primary_column']]
+    if columns is not None:
+        columns = list(columns) + [geo['primary_column']]
+    if bbox is None:
+        return gpd.read_parquet(path, columns=columns)
+
+    if isinstance(bbox, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        bbox = bbox.to_crs(CRS.from_user_input(geometry.get('crs') or GEOPARQUET_DEFAULT_CRS)).total_bounds
+    bbox = tuple(bbox)
+    if 'covering' in geometry:
+        return gpd.read_parquet(path, columns=columns, bbox=bbox)
+    # Files written elsewhere may not have a bbox column, so their features are filtered after reading
+    gdf = gpd.read_parquet(path, columns=columns)
+    return gdf.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+
+
+def vector_columns(path, layer=None):
+    """
+    Lists the attribute columns of a vector file without reading its features.
+
+    :param path: The path of the file. Its extension selects the format.
+    :param layer: The layer of a GeoPackage.
+    :return: The names of the attribute columns, without the geometry column.
+    """
+    if not is_parquet(path):
+        return list(pyogrio.read_info(path, layer=layer)['fields'])
+    schema = pq.read_schema(path)
+    geo = json.loads(schema.metadata[b'geo'])
+    geometry = geo['columns'][geo['primary_column']]
+    # The bbox column written for extent reads is not an attribute
+    covering = geometry.get('covering', {}).get('bbox', {}).get('xmin', [None])[0]
+    return [name for name in schema.names if name not in (geo['primary_column'], covering)]
+
+
+def write_vector(gdf, path, layer=None):
+    """
+    Writes a GeoDataFrame to a vector file.
+
+    :param gdf: The GeoDataFrame to write.
+    :param path: The path of the file. Its extension selects the format.
+    :param layer: The layer to write to a GeoPackage. Other layers of the file are kept.
+    """
+    if is_parquet(path):
+        gdf.to_parquet(path, write_covering_bbox=True)
+        return
+
+    extension = os.path.splitext(path)[1].lower()
+    drivers = {ext: driver for ext, driver in FORMATS.values() if driver is not None}
+    if extension not in drivers:
+        raise ValueError(f"Unknown vector format {extension!r}, expected one of "
+                         f"{sorted(drivers) + list(PARQUET_EXTENSIONS)}")
+    gdf.to_file(path, driver=drivers[extension], layer=layer, engine='pyogrio', use_arrow=True)
@@ -0,0 +1,93 @@
+import numpy as np
+import shapely
+from functools import lru_cache
+from pyproj import CRS, Transformer
+
+"""
+This module calculates the area of polygons in acres and hectares independently of their coordinate system.
+Geometries are projected on the fly to a Lambert Azimuthal Equal Area CRS centered on the data, so areas are
+correct for geographic, metric and US survey feet inputs alike without reprojecting the input files beforehand.
+Transformers are cached, so repeated calls for the same CRS and center reuse them.
+
+The module defines several functions:
+
+- equal_area_crs: Builds a Lambert Azimuthal Equal Area CRS centered on a longitude and latitude.
+- get_transformer: Returns a cached transformer between two coordinate systems.
+- data_center: Finds the longitude and latitude of the center of a GeoSeries.
+- area_square_meters: Calculates the equal-area area of each geometry in square meters.
+- area_acres_hectares: Calculates the equal-area area of each geometry in acres and hectares.
+"""
+
+SQUARE_METERS_PER_ACRE = 4046.8564224
+SQUARE_METERS_PER_HECTARE = 10000.0
+CENTER_DECIMALS = 1  # Round the projection center so nearby datasets share a cached transformer
+
+
+@lru_cache(maxsize=None)
+def equal_area_crs(longitude, latitude):
+    """
+    Builds a Lambert Azimuthal Equal Area CRS centered on a longitude and latitude.
+
+    :param longitude: The longitude of the projection center.
+    :param latitude: The latitude of the projection center.
+    :return: A pyproj CRS.
+    """
+    return CRS.from_proj4(f"+proj=laea +lat_0={latitude} +lon_0={longitude} +x_0=0 +y_0=0 +datum=WGS84 +units=m")
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs, target_crs):
+    """
+    Returns a cached transformer between two coordinate systems, using x/y axis order.
+
+    :param source_crs: The source CRS, as anything pyproj accepts.
+    :param target_crs: The target CRS, as anything pyproj accepts.
+    :return: A pyproj Transformer.
+    """
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def data_center(geoseries):
+    """
+    Finds the longitude and latitude of the center of a GeoSeries' extent, rounded to CENTER_DECIMALS.
+
+    :param geoseries: A GeoSeries with a CRS.
+    :return: A (longitude, latitude) tuple.
+    """
+    minx, miny, maxx, maxy = geoseries.total_bounds
+    transformer = get_transformer(geoseries.crs.to_wkt(), 'EPSG:4326')
+    longitude, latitude = transformer.transform((minx + maxx) / 2, (miny + maxy) / 2)
+    return round(longitude, CENTER_DECIMALS), round(latitude, CENTER_DECIMALS)
+
+
+def area_square_meters(geoseries):
+    """
+    Calculates the area of each geometry in square meters in an equal-area CRS centered on the data.
+
+    :param geoseries: A GeoSeries with a CRS.
+    :return: A numpy array of areas in square meters.
+    """
+    if geoseries.crs is None:
+        raise ValueError("Cannot calculate acreage for geometries without a CRS")
+    geometries = np.asarray(geoseries.array, dtype=object)
+    if len(geometries) == 0:
+        return np.zeros(0)
+
+    transformer = get_transformer(geoseries.crs.to_wkt(), equal_area_crs(*data_center(geoseries)))
+
+    def project(coordinates):
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1])
+        return np.column_stack([x, y])
+
+    return shapely.area(shapely.transform(geometries, project))
+
+
+def area_acres_hectares(geoseries):
+    """
+    Calculates the area of each geometry in acres and hectares in an equal-area CRS centered on the data.
+
+    :param geoseries: A GeoSeries with a CRS.
+    :return: A tuple of numpy arrays of areas in acres and in hectares.
+    """
+    square_meters = area_square_meters(geoseries)
+    return square_meters / SQUARE_METERS_PER_ACRE, square_meters / SQUARE_METERS_PER_HECTARE
@@ -1,21 +1,39 @@
 import geopandas as gpd
 import argparse
 import os
+import numpy as np
 import pandas as pd
+import shapely
 import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import add_profile_argument, profiling, stage
+from common.vector_io import DEFAULT_FORMAT, FORMATS, output_path, read_vector, vector_columns, write_vector
+
+import result_cache
+from acreage import area_acres_hectares
+from filters import MATCH_MODES, match_filter_values
 
 """
-This script is used for intersecting multiple shapefiles with an Area of Interest (AOI), filtering the features by attribute values, calculating the total acreage of the intersections, and generating CSV files with the results.
+This script is used for intersecting multiple shapefiles with an Area of Interest (AOI), filtering the features by attribute values, calculating the total acreage of the intersections, and generating CSV files with the results. Areas are calculated in an equal-area projection by the acreage module, so inputs and AOIs in any CRS report correct acres and hectares.
 
 The script defines several functions:
 
-- clear_directory: Deletes all files and directories in the specified directory.
-- read_shapefile: Reads a shapefile into a GeoDataFrame.
-- generate_csv: Generates a CSV file with the specified data.
-- intersect_with_aoi: Intersects a shapefile with an AOI, filters the features by attribute value, calculates the total acreage of the intersection, and generates a CSV file with the results.
+- clear_directory: Deletes all files and directories in the specified directory, used to discard the result cache with --force.
+- remove_output: Deletes an output file written by an earlier run, with its shapefile sidecar files.
+- read_shapefile: Reads a shapefile, or any vector file the shared vector_io module supports, into a GeoDataFrame.
+- generate_csv: Generates a CSV file with the total acreage and hectares of every filter value.
+- fast_intersection: Intersects polygons with an AOI using an STRtree prefilter, passing features inside the AOI through unclipped and clipping only features crossing its boundary, optionally in parallel.
+- intersect_input: Reads a shapefile once, intersects it with an AOI once, and derives the features and total acreage for every filter value from that single intersection.
+- input_results: Gets the features and total acreage of every filter value for one input, intersecting only the filter values without a cached result.
+- intersect_with_aoi: Intersects a shapefile with an AOI, generating an output file for each filter value and a CSV file with the results.
+- summarize_input: Intersects a shapefile with an AOI and returns its features and acreage summary in memory, for processing input files in worker processes.
+- write_consolidated: Writes one GeoPackage or GeoParquet file per input and a single acreage summary table.
 - main: Main function to intersect multiple shapefiles with an AOI, filter the features by attribute values, calculate the total acreage of the intersections, and generate CSV files with the results.
 
-The script uses argparse to parse command line arguments for the AOI shapefile, the shapefiles to intersect with the AOI, the output folder, the attribute name to filter by, and the attribute values to filter by.
+The script uses argparse to parse command line arguments for the AOI shapefile, the shapefiles to intersect with the AOI, the output folder, the attribute name to filter by, and the attribute values to filter by. Output files are GeoPackages unless --output_format selects FlatGeobuf, GeoParquet or shapefiles. With --jobs, input files are processed concurrently and the results are written as consolidated outputs. Results are cached in the output folder's .cache directory and reused while the inputs, AOI and filter settings are unchanged; --force recomputes them. Output files of an earlier run that the current run does not write again are removed.
 
 The script is executed from the command line and requires the geopandas, argparse, os, pandas, and shutil libraries.
 """
@@ -38,106 +56,368 @@ def clear_directory(directory):
             print('Failed to delete %s. Reason: %s' % (file_path, e))
 
 
-def read_shapefile(shp_path):
+def remove_output(output_file):
+    """
+    Deletes an output file, together with the sidecar files of a shapefile.
+
+    :param output_file: The path to the file.
+    """
+    stem, ext = os.path.splitext(output_file)
+    paths = [output_file]
+    if ext.lower() == '.shp':
+        paths = [stem + sidecar for sidecar in result_cache.SIDECAR_EXTENSIONS]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_shapefile(shp_path, bbox=None):
     """
-    Reads a shapefile into a GeoDataFrame.
+    Reads a shapefile, or any other vector file read_vector supports, into a GeoDataFrame.
 
-    :param shp_path: The path to the shapefile.
-    :return: A GeoDataFrame containing the shapefile data.
+    :param shp_path: The path to the file.
+    :param bbox: Optional GeoDataFrame whose extent limits the features read, reprojected to the file's CRS as needed.
+    :return: A GeoDataFrame containing the file's data.
     """
-    return gpd.read_file(shp_path)
+    return read_vector(shp_path, bbox=bbox)
 
 
-def generate_csv(output_dir, base_name, attribute_name, filter_value, total_acreage):
-    # Round the total acreage to 2 decimal places
+def generate_csv(output_dir, base_name, attribute_name, filter_values, total_acreages, total_hectares):
     """
-    Generates a CSV file with the specified data.
+    Generates a CSV file with the total acreage and hectares of every filter value, written in one go.
 
     :param output_dir: The directory to save the CSV file in.
     :param base_name: The base name for the CSV file.
     :param attribute_name: The attribute name to include in the CSV file.
-    :param filter_value: The filter value to include in the CSV file.
-    :param total_acreage: The total acreage to include in the CSV file.
+    :param filter_values: The filter values to include in the CSV file.
+    :param total_acreages: The total acreage of each filter value.
+    :param total_hectares: The total hectares of each filter value.
     """
-    # Round the total acreage to 2 decimal places
-    total_acreage = round(total_acreage, 2)
-
-    # Create a DataFrame for the CSV output
+    # Create a DataFrame for the CSV output, rounding the totals to 2 decimal places
     csv_data = pd.DataFrame({
-        'Attribute Name': [attribute_name],
-        'Filter Value': [filter_value],
-        'Total Acreage': [total_acreage]
+        'Attribute Name': attribute_name,
+        'Filter Value': list(filter_values),
+        'Total Acreage': [round(total_acreage, 2) for total_acreage in total_acreages],
+        'Total Hectares': [round(hectares, 2) for hectares in total_hectares]
     })
 
     # Save the DataFrame to a CSV file
     csv_file_name = f"{base_name}_aoi_intersect.csv"
     csv_file = os.path.join(output_dir, csv_file_name)
+    csv_data.to_csv(csv_file, index=False)
 
-    # Check if the CSV file already exists
-    if os.path.exists(csv_file):
-        # If it exists, append without writing the header
-        csv_data.to_csv(csv_file, mode='a', header=False, index=False)
-    else:
-        # If it doesn't exist, write the DataFrame to a new CSV file
-        csv_data.to_csv(csv_file, index=False)
+
+POLYGONAL_TYPE_IDS = [3, 6]  # shapely type ids of Polygon and MultiPolygon
+GEOMETRYCOLLECTION_TYPE_ID = 7
+CLIP_CHUNK_SIZE = 5000
+
+
+def polygonal_parts(geometries):
+    """
+    Reduces intersection results to their polygonal parts, like gpd.overlay does with keep_geom_type.
+
+    :param geometries: An array of shapely geometries.
+    :return: The array with geometry collections replaced by their polygons, and a mask of polygonal, non-empty results.
+    """
+    geometries = geometries.copy()
+    for index in np.flatnonzero(shapely.get_type_id(geometries) == GEOMETRYCOLLECTION_TYPE_ID):
+        parts = shapely.get_parts(shapely.get_parts(geometries[index]))
+        polygons = parts[shapely.get_type_id(parts) == 3]
+        geometries[index] = polygons[0] if len(polygons) == 1 else shapely.multipolygons(polygons)
+    keep = np.isin(shapely.get_type_id(geometries), POLYGONAL_TYPE_IDS) & ~shapely.is_empty(geometries)
+    return geometries, keep
 
 
-def intersect_with_aoi(aoi, input_file, output_dir, attribute_name, filter_value):
+def clip_geometries(geometries, aoi_geometry):
     """
-    Intersects a shapefile with an Area of Interest (AOI), filters the features by attribute value, 
-    calculates the total acreage of the intersection, and generates a CSV file with the results.
+    Clips geometries to an AOI geometry. Runs in a worker process when clipping in parallel.
+
+    :param geometries: An array of shapely geometries.
+    :param aoi_geometry: The shapely geometry to clip to.
+    :return: The clipped geometries.
+    """
+    return shapely.intersection(geometries, aoi_geometry)
+
+
+def fast_intersection(gdf, aoi, jobs=1):
+    """
+    Intersects polygon features with an AOI, returning the same rows and columns as
+    gpd.overlay(gdf, aoi, how='intersection'). An STRtree query keeps only features touching each AOI feature,
+    features entirely inside the AOI feature are passed through without clipping, and only features crossing its
+    boundary are clipped, in chunks across worker processes when jobs > 1. Non-polygon layers use gpd.overlay.
+
+    :param gdf: The GeoDataFrame to intersect, in the AOI's CRS.
+    :param aoi: The AOI to intersect with.
+    :param jobs: The number of worker processes for clipping.
+    :return: A GeoDataFrame of the intersections with the attributes of both inputs.
+    """
+    geometries = np.asarray(gdf.geometry.array, dtype=object)
+    if len(gdf) == 0 or not np.isin(shapely.get_type_id(geometries), POLYGONAL_TYPE_IDS).all():
+        return gpd.overlay(gdf, aoi, how='intersection')
+
+    geometries = np.where(shapely.is_valid(geometries), geometries, shapely.make_valid(geometries))
+    tree = shapely.STRtree(geometries)
+
+    left_rows, right_rows, results = [], [], []
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for aoi_row, aoi_geometry in enumerate(aoi.geometry.values):
+            aoi_geometry = shapely.make_valid(aoi_geometry)
+            shapely.prepare(aoi_geometry)
+            candidates = tree.query(aoi_geometry, predicate='intersects')
+            inside = shapely.within(geometries[candidates], aoi_geometry)
+            crossing = candidates[~inside]
+
+            chunks = [geometries[crossing[i:i + CLIP_CHUNK_SIZE]] for i in range(0, len(crossing), CLIP_CHUNK_SIZE)]
+            if executor is not None and len(chunks) > 1:
+                clipped = list(executor.map(clip_geometries, chunks, [aoi_geometry] * len(chunks)))
+            else:
+                clipped = [clip_geometries(chunk, aoi_geometry) for chunk in chunks]
+
+            rows = np.concatenate([candidates[inside], crossing])
+            left_rows.append(rows)
+            right_rows.append(np.full(len(rows), aoi_row))
+            results.append(np.concatenate([geometries[candidates[inside]]] + clipped))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    left_rows, right_rows = np.concatenate(left_rows), np.concatenate(right_rows)
+    result_geometries, keep = polygonal_parts(np.concatenate(results))
+
+    # Keep overlay's row order (by input feature, then AOI feature) and its _1/_2 suffixes for shared column names
+    order = np.lexsort((right_rows[keep], left_rows[keep]))
+    left = gdf.drop(columns=gdf.geometry.name).iloc[left_rows[keep][order]].reset_index(drop=True)
+    right = aoi.drop(columns=aoi.geometry.name).iloc[right_rows[keep][order]].reset_index(drop=True)
+    shared = left.columns.intersection(right.columns)
+    left = left.rename(columns={column: f"{column}_1" for column in shared})
+    right = right.rename(columns={column: f"{column}_2" for column in shared})
+    return gpd.GeoDataFrame(pd.concat([left, right], axis=1), geometry=result_geometries[keep][order], crs=aoi.crs)
+
+
+def intersect_input(aoi, input_file, attribute_name, filter_values, clip_jobs=1, match_mode='regex'):
+    """
+    Intersects a shapefile with an Area of Interest (AOI) for every filter value at once. The shapefile is read
+    once, limited to the AOI extent, reprojected once and overlaid with the AOI once, and each filter value's
+    features and total acreage are taken from that single intersection.
 
     :param aoi: The AOI to intersect with.
     :param input_file: The shapefile to intersect with the AOI.
-    :param output_dir: The directory to save the output files in.
     :param attribute_name: The attribute name to filter by.
-    :param filter_value: The attribute value to filter by.
+    :param filter_values: The attribute values to filter by.
+    :param clip_jobs: The number of worker processes used to clip features crossing the AOI boundary.
+    :param match_mode: How filter values match the attribute: 'regex', 'contains', 'prefix' or 'exact'.
+    :return: The intersection, a DataFrame flagging which filter values each intersection matches, and a DataFrame
+             with the total acres and hectares of each filter value.
     """
-    # Load the input file
-    input_gdf = read_shapefile(input_file)
-    print(f"Loaded input file with {len(input_gdf)} features.")
+    # Load the input file, only reading features within the AOI extent
+    with stage('read') as read_stage:
+        input_gdf = read_shapefile(input_file, bbox=aoi)
+        read_stage.add(features=len(input_gdf))
+    print(f"Loaded {input_file} with {len(input_gdf)} features within the AOI extent.")
+
+    # Flag the features matching each filter value and keep those matching any of them
+    with stage('filter', features=len(input_gdf)):
+        matches = match_filter_values(input_gdf[attribute_name], filter_values, match_mode)
+        filtered_gdf = input_gdf[matches.any(axis=1)].copy()
+        filtered_gdf['_match_row'] = filtered_gdf.index
+    print(f"Filtered {input_file} to {len(filtered_gdf)} features.")
 
-    # Filter the input file based on the attribute value
-    filtered_gdf = input_gdf[input_gdf[attribute_name].str.contains(filter_value)]
-    print(f"Filtered input file to {len(filtered_gdf)} features.")
-
-    print(aoi.crs)
     # Check if the CRS of the input file matches the CRS of the AOI
     if filtered_gdf.crs != aoi.crs:
         # If not, reproject the input file to match the AOI's CRS
-        filtered_gdf = filtered_gdf.to_crs(aoi.crs)
+        with stage('reproject', features=len(filtered_gdf)):
+            filtered_gdf = filtered_gdf.to_crs(aoi.crs)
 
     # Perform the intersection
-    intersection = gpd.overlay(filtered_gdf, aoi, how='intersection')
-    print(f"Found {len(intersection)} intersections.")
+    with stage('intersect', features=len(filtered_gdf)):
+        intersection = fast_intersection(filtered_gdf, aoi, clip_jobs)
+    print(f"Found {len(intersection)} intersections in {input_file}.")
+
+    # Calculate the equal-area area of the intersection in acres and hectares and round to 2 decimal places
+    with stage('acreage', features=len(intersection)):
+        area_acres, area_hectares = area_acres_hectares(intersection.geometry)
+        intersection['area_acres'] = np.round(area_acres, 2)
+        intersection['area_ha'] = np.round(area_hectares, 2)
+
+    # Look up each intersection's filter matches and total the acres and hectares for every filter value
+    intersection_matches = matches.loc[intersection.pop('_match_row')].reset_index(drop=True)
+    totals = pd.DataFrame({
+        'acres': intersection_matches.mul(intersection['area_acres'], axis=0).sum(),
+        'hectares': intersection_matches.mul(intersection['area_ha'], axis=0).sum()
+    })
+    return intersection, intersection_matches, totals
 
-    # Calculate the area of the intersection in acres and round to 2 decimal places
-    intersection['area_acres'] = intersection['geometry'].area / 43560
-    intersection['area_acres'] = intersection['area_acres'].round(2)
+
+def input_results(aoi, aoi_digest, input_file, attribute_name, filter_values, cache_dir, index, clip_jobs=1,
+                  match_mode='regex'):
+    """
+    Gets the intersected features and total acreage of every filter value for one input, reusing cached results.
+    Only the filter values without a cached result are intersected, together in a single pass, and their results
+    are written to the cache.
+
+    :param aoi: The AOI to intersect with.
+    :param aoi_digest: The digest of the AOI file.
+    :param input_file: The shapefile to intersect with the AOI.
+    :param attribute_name: The attribute name to filter by.
+    :param filter_values: The attribute values to filter by.
+    :param cache_dir: The cache directory.
+    :param index: The cache index. It is not modified.
+    :param clip_jobs: The number of worker processes used to clip features crossing the AOI boundary.
+    :param match_mode: How filter values match the attribute: 'regex', 'contains', 'prefix' or 'exact'.
+    :return: A dictionary mapping each filter value to its (features, acres, hectares), and a dictionary of the new
+             index entries.
+    """
+    filter_values = list(dict.fromkeys(filter_values))
+    input_digest = result_cache.file_digest(input_file)
+    keys = {value: result_cache.cache_key(input_digest, aoi_digest, attribute_name, value, match_mode,
+                                          aoi.crs.to_string())
+            for value in filter_values}
+
+    results, entries = {}, {}
+    missing = []
+    for value in filter_values:
+        entry = result_cache.cached_entry(cache_dir, index, keys[value])
+        if entry is None:
+            missing.append(value)
+        else:
+            results[value] = (result_cache.read_features(cache_dir, entry), entry['acres'], entry['hectares'])
+    if results:
+        print(f"Reusing cached results for {len(results)} filter values of {input_file}.")
+
+    if missing:
+        intersection, intersection_matches, totals = intersect_input(aoi, input_file, attribute_name, missing,
+                                                                     clip_jobs, match_mode)
+        for value in missing:
+            features = intersection[intersection_matches[value]].reset_index(drop=True)
+            acres, hectares = totals.loc[value, 'acres'], totals.loc[value, 'hectares']
+            entries[keys[value]] = result_cache.store_result(cache_dir, keys[value], features, acres, hectares,
+                                                             input_file, value)
+            results[value] = (features, acres, hectares)
+
+    return results, entries
+
+
+def intersect_with_aoi(aoi, aoi_digest, input_file, output_dir, attribute_name, filter_values, cache_dir, index,
+                       clip_jobs=1, match_mode='regex', output_format=DEFAULT_FORMAT):
+    """
+    Intersects a shapefile with an AOI for every filter value at once, and writes an output file for each filter
+    value and a CSV file with their total acreage.
+
+    :param aoi: The AOI to intersect with.
+    :param aoi_digest: The digest of the AOI file.
+    :param input_file: The shapefile to intersect with the AOI.
+    :param output_dir: The directory to save the output files in.
+    :param attribute_name: The attribute name to filter by.
+    :param filter_values: The attribute values to filter by.
+    :param cache_dir: The cache directory.
+    :param index: The cache index, updated with the new results.
+    :param clip_jobs: The number of worker processes used to clip features crossing the AOI boundary.
+    :param match_mode: How filter values match the attribute: 'regex', 'contains', 'prefix' or 'exact'.
+    :param output_format: The format of the output files, one of FORMATS.
+    :return: The paths of the files written.
+    """
+    results, entries = input_results(aoi, aoi_digest, input_file, attribute_name, filter_values, cache_dir, index,
+                                     clip_jobs, match_mode)
+    index.update(entries)
+    written = []
 
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    # Modify the output file name
-    base_name, ext = os.path.splitext(os.path.basename(input_file))
-    output_file_name = f"{base_name}_{filter_value}_aoi_intersect{ext}"
-
-    # Delete any existing file with the same name
-    output_file = os.path.join(output_dir, output_file_name)
-    if os.path.exists(output_file):
-        os.remove(output_file)
+    base_name = os.path.splitext(os.path.basename(input_file))[0]
+    for filter_value, (features, _, _) in results.items():
+        # Delete any existing file with the same name
+        output_file = output_path(output_dir, f"{base_name}_{filter_value}_aoi_intersect", output_format)
+        if os.path.exists(output_file):
+            os.remove(output_file)
 
-    # Save the result
-    intersection.to_file(output_file)
-    print(f"Saved intersection to {output_file}.")
+        # Save the result
+        with stage('write', features=len(features)):
+            write_vector(features, output_file)
+        written.append(output_file)
+        print(f"Saved intersection to {output_file}.")
 
     # Generate the CSV file
-    total_acreage = intersection['area_acres'].sum()
-    generate_csv(output_dir, base_name, attribute_name, filter_value, total_acreage)
+    generate_csv(output_dir, base_name, attribute_name, list(results),
+                 [acres for _, acres, _ in results.values()], [hectares for _, _, hectares in results.values()])
+    written.append(os.path.join(output_dir, f"{base_name}_aoi_intersect.csv"))
     print(f"Generated CSV file with total acreage.")
+    return written
 
 
-def main(aoi_path, intersect_files, output_folder, attribute_name, filter_values):
+def summarize_input(aoi, aoi_digest, input_file, attribute_name, filter_values, cache_dir, index, clip_jobs=1,
+                    match_mode='regex'):
+    """
+    Intersects a shapefile with an AOI and collects its results in memory. Runs in a worker process with --jobs.
+
+    :param aoi: The AOI to intersect with.
+    :param aoi_digest: The digest of the AOI file.
+    :param input_file: The shapefile to intersect with the AOI.
+    :param attribute_name: The attribute name to filter by.
+    :param filter_values: The attribute values to filter by.
+    :param cache_dir: The cache directory.
+    :param index: The cache index. It is not modified.
+    :param clip_jobs: The number of worker processes used to clip features crossing the AOI boundary.
+    :param match_mode: How filter values match the attribute: 'regex', 'contains', 'prefix' or 'exact'.
+    :return: The intersected features of every filter value with a filter_value column, a DataFrame with the
+             total acres and hectares of each filter value, and the new cache index entries.
+    """
+    results, entries = input_results(aoi, aoi_digest, input_file, attribute_name, filter_values, cache_dir, index,
+                                     clip_jobs, match_mode)
+
+    # Stack each filter value's features, so a feature matching several values appears once for each
+    features = [value_features.assign(filter_value=value) for value, (value_features, _, _) in results.items()]
+    if features:
+        features = gpd.GeoDataFrame(pd.concat(features, ignore_index=True), geometry='geometry', crs=aoi.crs)
+    else:
+        # No filter values were given, so there are no features, only the input's columns
+        features = gpd.GeoDataFrame(columns=vector_columns(input_file) + ['filter_value', 'geometry'],
+                                    geometry='geometry', crs=aoi.crs)
+
+    summary = pd.DataFrame({
+        'Input File': input_file,
+        'Attribute Name': attribute_name,
+        'Filter Value': list(results),
+        'Total Acreage': [round(acres, 2) for _, acres, _ in results.values()],
+        'Total Hectares': [round(hectares, 2) for _, _, hectares in results.values()]
+    })
+    return features, summary, entries
+
+
+def write_consolidated(results, output_folder, output_format=DEFAULT_FORMAT):
+    """
+    Writes the collected results of every input: one file per input holding the features of all filter values, and
+    a single acreage summary table as CSV and Parquet.
+
+    :param results: A list of (input file, features, summary) tuples.
+    :param output_folder: The directory to save the output files in.
+    :param output_format: The format of the per-input files, one of FORMATS.
+    :return: The paths of the files written.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    written = []
+    for input_file, features, _ in results:
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        output_file = output_path(output_folder, f"{base_name}_aoi_intersect", output_format)
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        with stage('write', features=len(features)):
+            write_vector(features, output_file)
+        written.append(output_file)
+        print(f"Saved intersection to {output_file}.")
+
+    summary = pd.concat([summary for _, _, summary in results], ignore_index=True)
+    summary_files = [os.path.join(output_folder, "acreage_summary.csv"),
+                     os.path.join(output_folder, "acreage_summary.parquet")]
+    summary.to_csv(summary_files[0], index=False)
+    summary.to_parquet(summary_files[1], index=False)
+    print(f"Generated acreage summary for {len(results)} input files.")
+    return written + summary_files
+
+
+def main(aoi_path, intersect_files, output_folder, attribute_name, filter_values, clip_jobs=1, jobs=None,
+         output_format=DEFAULT_FORMAT, match_mode='regex', force=False):
     """
     Main function to intersect multiple shapefiles with an AOI, filter the features by attribute values, 
     calculate the total acreage of the intersections, and generate CSV files with the results.
@@ -147,18 +427,60 @@ def main(aoi_path, intersect_files, output_folder, attribute_name, filter_values
     :param output_folder: The directory to save the output files in.
     :param attribute_name: The attribute name to filter by.
     :param filter_values: A list of attribute values to filter by.
+    :param clip_jobs: The number of worker processes used to clip features crossing the AOI boundary.
+    :param jobs: The number of input files processed concurrently. When set, the results are collected in memory
+                 and written as one file per input and a consolidated acreage summary instead of per-value
+                 files and per-input CSV files.
+    :param output_format: The format of the output files, one of FORMATS.
+    :param match_mode: How filter values match the attribute: 'regex', 'contains', 'prefix' or 'exact'.
+    :param force: Whether to discard the cached results and recompute every intersection.
     """
-    # Clear the output folder
-    clear_directory(output_folder)
+    # Cached results are reused unless a recompute is forced. Output files of the previous run that this run does not
+    # write again, such as those of filter values no longer listed, are removed once this run's files are written.
+    cache_dir = os.path.join(output_folder, result_cache.CACHE_FOLDER)
+    os.makedirs(cache_dir, exist_ok=True)
+    previous_outputs = result_cache.load_outputs(cache_dir)
+    if force:
+        clear_directory(cache_dir)
+    index = result_cache.load_index(cache_dir)
 
     aoi = read_shapefile(aoi_path)
-    for intersect_file in intersect_files:
-        for filter_value in filter_values:
-            intersect_with_aoi(aoi, intersect_file, output_folder, attribute_name, filter_value)
+    aoi_digest = result_cache.file_digest(aoi_path)
+    written = []
+    if jobs is None:
+        for intersect_file in intersect_files:
+            written += intersect_with_aoi(aoi, aoi_digest, intersect_file, output_folder, attribute_name,
+                                          filter_values, cache_dir, index, clip_jobs, match_mode, output_format)
+            result_cache.save_index(cache_dir, index)
+    else:
+        count = len(intersect_files)
+        tasks = ([aoi] * count, [aoi_digest] * count, intersect_files, [attribute_name] * count,
+                 [filter_values] * count, [cache_dir] * count, [index] * count, [clip_jobs] * count,
+                 [match_mode] * count)
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                collected = list(executor.map(summarize_input, *tasks))
+        else:
+            collected = list(map(summarize_input, *tasks))
+        for _, _, entries in collected:
+            index.update(entries)
+        result_cache.save_index(cache_dir, index)
+        results = [(intersect_file, features, summary)
+                   for intersect_file, (features, summary, _) in zip(intersect_files, collected)]
+        written += write_consolidated(results, output_folder, output_format)
     
     # Save the AOI to the output directory
-    aoi_output_file = os.path.join(output_folder, "aoi.shp")
-    aoi.to_file(aoi_output_file)
+    aoi_output_file = output_path(output_folder, "aoi", output_format)
+    if os.path.exists(aoi_output_file):
+        os.remove(aoi_output_file)
+    write_vector(aoi, aoi_output_file)
+    written.append(aoi_output_file)
+
+    outputs = [os.path.relpath(path, output_folder) for path in written]
+    for stale in set(previous_outputs) - set(outputs):
+        remove_output(os.path.join(output_folder, stale))
+        print(f"Removed {stale}, an output of an earlier run that this run did not write.")
+    result_cache.save_outputs(cache_dir, outputs)
 
 
 if __name__ == "__main__":
@@ -168,5 +490,13 @@ if __name__ == "__main__":
     parser.add_argument('--output_folder', metavar='output_folder', type=str, required=True, help='path to output folder')
     parser.add_argument('--attribute_name', metavar='attribute_name', type=str, required=True, help='attribute name to filter by')
     parser.add_argument('--filter_values', metavar='filter_values', type=str, nargs='*', help='attribute values to filter by')
+    parser.add_argument('--clip_jobs', metavar='clip_jobs', type=int, default=1, help='worker processes for clipping features that cross the AOI boundary')
+    parser.add_argument('--jobs', metavar='jobs', type=int, help='process input files concurrently in this many worker processes and write consolidated outputs')
+    parser.add_argument('--output_format', metavar='output_format', choices=list(FORMATS), default=DEFAULT_FORMAT, help='format of the output files: gpkg (default), fgb, parquet or shp')
+    parser.add_argument('--match_mode', metavar='match_mode', choices=MATCH_MODES, default='regex', help='how filter values match the attribute: regex (default), contains, prefix or exact')
+    parser.add_argument('--force', action='store_true', help='discard cached results and recompute every intersection')
+    add_profile_argument(parser)
     args = parser.parse_args()
-    main(args.aoi, args.intersect_files, args.output_folder, args.attribute_name, args.filter_values)
\ No newline at end of file
+    with profiling(args.profile, 'filter_calc_acres'):
+        main(args.aoi, args.intersect_files, args.output_folder, args.attribute_name, args.filter_values, args.clip_jobs,
+             args.jobs, args.output_format, args.match_mode, args.force)
\ No newline at end of file
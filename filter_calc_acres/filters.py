@@ -0,0 +1,81 @@
+import re
+import numpy as np
+import pandas as pd
+
+"""
+This module matches an attribute column against several filter values in one vectorized pass. The column is
+factorized once into its unique values, each compiled filter value is evaluated only against those unique values,
+and the per-value results are broadcast back to every feature through the category codes. Layers with hundreds of
+thousands of features but a few dozen distinct attribute values are matched in the time of scanning those few
+dozen strings.
+
+Filter values can be matched in four modes:
+
+- regex: The value is a regular expression searched for anywhere in the attribute, like str.contains. This is the default.
+- contains: The value is a literal substring of the attribute.
+- prefix: The attribute starts with the value.
+- exact: The attribute equals the value.
+
+Attribute values that are not strings, such as the numbers of an id column, are matched as their text, so the filter
+value 1 matches the attribute 1 (and in regex mode 10 and 21 as well).
+"""
+
+MATCH_MODES = ['regex', 'contains', 'prefix', 'exact']
+
+
+def compile_matcher(filter_value, mode='regex'):
+    """
+    Compiles a filter value into a function that tests one attribute string.
+
+    :param filter_value: The filter value.
+    :param mode: The match mode, one of MATCH_MODES.
+    :return: A function taking a string and returning whether it matches.
+    """
+    if mode == 'regex':
+        return re.compile(filter_value).search
+    if mode == 'contains':
+        return lambda text: filter_value in text
+    if mode == 'prefix':
+        return lambda text: text.startswith(filter_value)
+    if mode == 'exact':
+        return lambda text: text == filter_value
+    raise ValueError(f"Unknown match mode {mode!r}, expected one of {MATCH_MODES}")
+
+
+def attribute_text(value):
+    """
+    Gets the text a filter value is matched against. Whole floats lose their decimal point, as integer columns with
+    missing values are read as floats.
+
+    :param value: An attribute value, not missing.
+    :return: The value as a string.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (float, np.floating)) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def match_filter_values(values, filter_values, mode='regex'):
+    """
+    Flags which filter values each attribute value matches. Non-string attribute values are matched as their text,
+    and missing values match nothing.
+
+    :param values: A Series of attribute values.
+    :param filter_values: The filter values to match.
+    :param mode: The match mode, one of MATCH_MODES.
+    :return: A DataFrame of booleans with one column per filter value, indexed like values.
+    """
+    filter_values = list(dict.fromkeys(filter_values))
+    matchers = [compile_matcher(filter_value, mode) for filter_value in filter_values]
+
+    # Evaluate every matcher on the unique attribute values only
+    codes, categories = pd.factorize(values)
+    category_matches = np.zeros((len(categories) + 1, len(matchers)), dtype=bool)
+    for row, category in enumerate(categories):
+        text = attribute_text(category)
+        category_matches[row] = [bool(matcher(text)) for matcher in matchers]
+
+    # Broadcast back to the features; missing values have code -1, which selects the all-False last row
+    return pd.DataFrame(category_matches[codes], index=values.index, columns=filter_values)
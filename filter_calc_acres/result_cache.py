@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import json
+import os
+import geopandas as gpd
+
+"""
+This module caches intersection results between runs of filter_calc_acres. Each result is the intersected features
+and total acreage of one filter value in one input file, stored as GeoParquet under the output folder's .cache
+directory. A result's key is a hash of the input file and its sidecar files, the AOI, the attribute name, the filter
+value, the match mode and the output CRS, so a result is reused only while all of them are unchanged. A JSON index
+maps the keys to the stored results and their acreage.
+
+The module defines several functions:
+
+- file_digest: Hashes a file together with its sidecar files.
+- cache_key: Builds the key of one filter value's result.
+- load_index: Loads the cache index.
+- save_index: Saves the cache index atomically.
+- cached_entry: Looks up a result that is still present in the cache.
+- read_features: Reads the features of a cached result.
+- store_result: Writes the features of a result to the cache and returns its index entry.
+- load_outputs: Loads the list of output files written by the previous run.
+- save_outputs: Saves the list of output files written by this run.
+"""
+
+CACHE_FOLDER = '.cache'
+INDEX_FILE = 'index.json'
+OUTPUTS_FILE = 'outputs.json'
+HASH_BLOCK_SIZE = 1024 * 1024
+SIDECAR_EXTENSIONS = ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+
+
+def file_digest(path):
+    """
+    Hashes a file, together with the sidecar files of a shapefile, in blocks.
+
+    :param path: The path to the file.
+    :return: The SHA-256 hex digest of the file contents.
+    """
+    stem, ext = os.path.splitext(path)
+    paths = [path]
+    if ext.lower() == '.shp':
+        paths = sorted(p for p in glob.glob(glob.escape(stem) + '.*')
+                       if os.path.splitext(p)[1].lower() in SIDECAR_EXTENSIONS)
+
+    digest = hashlib.sha256()
+    for file_path in paths:
+        digest.update(os.path.splitext(file_path)[1].lower().encode())
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(input_digest, aoi_digest, attribute_name, filter_value, match_mode, crs):
+    """
+    Builds the key of one filter value's result.
+
+    :param input_digest: The digest of the input file.
+    :param aoi_digest: The digest of the AOI file.
+    :param attribute_name: The attribute name filtered by.
+    :param filter_value: The filter value.
+    :param match_mode: The match mode of the filter value.
+    :param crs: The CRS of the results, as a string.
+    :return: The SHA-256 hex digest of the key.
+    """
+    key = json.dumps([input_digest, aoi_digest, attribute_name, filter_value, match_mode, crs])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def load_index(cache_dir):
+    """
+    Loads the cache index.
+
+    :param cache_dir: The cache directory.
+    :return: A dictionary mapping keys to index entries, empty when there is no index.
+    """
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def save_index(cache_dir, index):
+    """
+    Saves the cache index, replacing the index file atomically.
+
+    :param cache_dir: The cache directory.
+    :param index: A dictionary mapping keys to index entries.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(index_path + '.tmp', index_path)
+
+
+def cached_entry(cache_dir, index, key):
+    """
+    Looks up a result in the cache.
+
+    :param cache_dir: The cache directory.
+    :param index: The cache index.
+    :param key: The key of the result.
+    :return: The index entry, or None when the result is not cached or its features file is missing.
+    """
+    entry = index.get(key)
+    if entry is None or not os.path.exists(os.path.join(cache_dir, entry['features'])):
+        return None
+    return entry
+
+
+def read_features(cache_dir, entry):
+    """
+    Reads the features of a cached result.
+
+    :param cache_dir: The cache directory.
+    :param entry: The index entry of the result.
+    :return: A GeoDataFrame of the features.
+    """
+    return gpd.read_parquet(os.path.join(cache_dir, entry['features']))
+
+
+def store_result(cache_dir, key, features, acres, hectares, input_file, filter_value):
+    """
+    Writes the features of a result to the cache. The index is not updated, so results can be stored from worker
+    processes and added to the index by the caller.
+
+    :param cache_dir: The cache directory.
+    :param key: The key of the result.
+    :param features: A GeoDataFrame of the intersected features.
+    :param acres: The total acreage of the result.
+    :param hectares: The total hectares of the result.
+    :param input_file: The input file of the result.
+    :param filter_value: The filter value of the result.
+    :return: The index entry of the result.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    features_file = f"{key}.parquet"
+    features.to_parquet(os.path.join(cache_dir, features_file))
+    return {
+        'features': features_file,
+        'input_file': input_file,
+        'filter_value': filter_value,
+        'acres': float(acres),
+        'hectares': float(hectares)
+    }
+
+
+def load_outputs(cache_dir):
+    """
+    Loads the list of output files written by the previous run, so files it wrote that this run does not write
+    again can be removed.
+
+    :param cache_dir: The cache directory.
+    :return: The file names, relative to the output folder. Empty when no run recorded its outputs.
+    """
+    outputs_path = os.path.join(cache_dir, OUTPUTS_FILE)
+    if not os.path.exists(outputs_path):
+        return []
+    with open(outputs_path) as f:
+        return json.load(f)
+
+
+def save_outputs(cache_dir, outputs):
+    """
+    Saves the list of output files written by this run, replacing the list file atomically.
+
+    :param cache_dir: The cache directory.
+    :param outputs: The file names, relative to the output folder.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    outputs_path = os.path.join(cache_dir, OUTPUTS_FILE)
+    with open(outputs_path + '.tmp', 'w') as f:
+        json.dump(sorted(outputs), f, indent=2)
+    os.replace(outputs_path + '.tmp', outputs_path)
@@ -1,4 +1,6 @@
 import argparse
+import os
+import sys
 from base import base
 
 from wv import wv
@@ -9,6 +11,9 @@ from oh import oh
 from va import va
 from al import al
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.profiling import add_profile_argument, profiling, stage
+
 
 scrapers = {
     # "wv" : wv,
@@ -34,11 +39,13 @@ def main(test=False, reset=False, subset=None, max_age=None):
             continue
 
 
-        s = scraper(test=test)
-        s.update()
+        with stage(name):
+            s = scraper(test=test)
+            s.update()
 
 
-    base().export()
+    with stage('export'):
+        base().export()
 
 
 if __name__ == "__main__":
@@ -47,4 +54,7 @@ if __name__ == "__main__":
     parser.add_argument("--test", default=False, action='store_true', help="")
     parser.add_argument("--subset", default=None, nargs='*', help="")
     parser.add_argument("--max_age", default=None, type=float, help="")
-    main(**vars(parser.parse_args()))
+    add_profile_argument(parser)
+    args = vars(parser.parse_args())
+    with profiling(args.pop('profile'), 'mines'):
+        main(**args)
@@ -1,49 +1,213 @@
 import pandas as pd
 import numpy as np 
+import pyarrow as pa
+import pyarrow.parquet as pq
+import geopandas as gpd
+import rasterio
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor
 import argparse
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import add_profile_argument, profiling, stage
 
 """
 This script processes a CSV or Excel file, maps the 'value' column to categories based on a predefined mapping,
 calculates the sum and percentage of 'count' for each category, and writes the results to an output file.
+An aspect raster (GeoTIFF, IMG or VRT) can also be given directly, in which case the category counts are
+built block by block from the raster itself without exporting a histogram table first.
+
+With --batch, input_file is a glob pattern matching many rasters or tables. Every input (and every zone of an
+optional zone layer) is processed in a pool of worker processes and the results are written to one consolidated
+table, CSV or Parquet depending on the extension of final_file.
 """
 
-def read_file(file_path):
+# Aspect values (degrees clockwise from north) at which each direction starts. -1 is flat, as written by ArcGIS
+# Aspect and slope_engine.compute_aspect. Other negative values, such as NoData, are left out.
+ASPECT_BIN_EDGES = np.array([0, 22.5, 67.5, 112.5, 157.5, 202.5, 247.5, 292.5, 337.5])
+ASPECT_BIN_CATEGORIES = np.array(['flat', 'north', 'northeast', 'east', 'southeast', 'south', 'southwest',
+                                  'west', 'northwest', 'north'], dtype=object)
+ASPECT_CATEGORIES = ['flat', 'north', 'northeast', 'east', 'southeast', 'south', 'southwest', 'west', 'northwest']
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.img', '.vrt')
+DEFAULT_CHUNKSIZE = 1_000_000
+INTERMEDIATE_SCHEMA = pa.schema([('value', pa.float64()), ('category', pa.dictionary(pa.int8(), pa.string()))])
+
+
+def cached_parquet(file_path):
     """
-    Reads a file into a pandas DataFrame.
-    Supports CSV and Excel files.
+    Converts an Excel file to a Parquet file next to it, reusing the conversion while the Excel file is unchanged.
+
+    Parameters:
+    file_path (str): The path to the Excel file.
+
+    Returns:
+    str: The path to the cached Parquet file.
+    """
+    parquet_path = f"{file_path}.parquet"
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(file_path):
+        pd.read_excel(file_path).to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+def read_file(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Reads a file into pandas DataFrames of at most chunksize rows.
+    Supports CSV, Excel and Parquet files. Excel files are converted to a cached Parquet file on first use.
 
     Parameters:
     file_path (str): The path to the file.
+    chunksize (int): The number of rows per chunk.
 
     Returns:
-    DataFrame: A DataFrame containing the data from the file.
+    generator: A generator that yields DataFrames containing the data from the file.
     """
     if file_path.endswith('.csv'):
-        dataframe = pd.read_csv(file_path)
-    elif file_path.endswith('.xlsx'):
-        dataframe = pd.read_excel(file_path)
-    else:
-        raise ValueError("Unsupported file type. Please provide a CSV or Excel file.")
-    return dataframe
+        yield from pd.read_csv(file_path, chunksize=chunksize)
+        return
+    if file_path.endswith('.xlsx'):
+        file_path = cached_parquet(file_path)
+    elif not file_path.endswith('.parquet'):
+        raise ValueError("Unsupported file type. Please provide a CSV, Excel or Parquet file.")
+
+    for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def is_raster(file_path):
+    """
+    Checks whether a path points to a raster rather than a histogram table.
+
+    Parameters:
+    file_path (str): The path to the file.
+
+    Returns:
+    bool: True if the file extension is a supported raster format.
+    """
+    return file_path.lower().endswith(RASTER_EXTENSIONS)
+
+
+def aspect_bin_indices(values):
+    """
+    Assigns aspect values to direction bins using the bin edges.
+
+    Parameters:
+    values (ndarray): Aspect values in degrees, with -1 meaning flat.
+
+    Returns:
+    ndarray: Bin indices into ASPECT_BIN_CATEGORIES, or -1 for NaN and values other than -1 outside 0-360, such as
+    NoData.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    indices = np.digitize(values, ASPECT_BIN_EDGES)
+    indices[((values < 0) & (values != -1)) | (values > 360) | np.isnan(values)] = -1
+    return indices
 
 
-def map_values_to_categories(dataframe, category_mapping):
+def map_values_to_categories(dataframe):
     """
-    Maps the 'value' column of the dataframe to 'category' using the provided mapping.
+    Maps the 'value' column of the dataframe to 'category' using the aspect bin edges.
 
     Parameters:
     dataframe (DataFrame): The DataFrame to map.
-    category_mapping (dict): The mapping from values to categories.
 
     Returns:
     DataFrame: The DataFrame with the 'value' column mapped to 'category'.
     """
     if 'value' not in dataframe.columns:
         raise ValueError("'value' column not found in the dataframe.")
-    dataframe['category'] = dataframe['value'].map(category_mapping)
+    indices = aspect_bin_indices(dataframe['value'].to_numpy())
+    categories = ASPECT_BIN_CATEGORIES[np.clip(indices, 0, None)]
+    categories[indices < 0] = None
+    dataframe['category'] = categories
     return dataframe
 
 
+def counts_to_dataframe(bin_counts):
+    """
+    Folds per-bin pixel counts into one row per aspect category.
+
+    Parameters:
+    bin_counts (ndarray): Counts for each entry of ASPECT_BIN_CATEGORIES.
+
+    Returns:
+    DataFrame: A DataFrame with 'category' and 'count' columns.
+    """
+    counts = pd.Series(bin_counts, index=ASPECT_BIN_CATEGORIES).groupby(level=0).sum()
+    counts = counts.reindex(ASPECT_CATEGORIES, fill_value=0)
+    return pd.DataFrame({'category': counts.index, 'count': counts.to_numpy()})
+
+
+def raster_category_counts(raster_path, band=1, geometry=None):
+    """
+    Counts the pixels of an aspect raster in each aspect category, reading one block at a time.
+
+    Parameters:
+    raster_path (str): The path to the aspect raster.
+    band (int): The band to read.
+    geometry (Geometry, optional): A zone in the raster's CRS. Only pixels whose centers fall inside it are counted.
+
+    Returns:
+    DataFrame: A DataFrame with 'category' and 'count' columns.
+    """
+    bin_counts = np.zeros(len(ASPECT_BIN_CATEGORIES), dtype=np.int64)
+    with rasterio.open(raster_path) as src:
+        full_window = Window(0, 0, src.width, src.height)
+        zone_window = None
+        if geometry is not None:
+            bounds = src.window(*geometry.bounds)
+            col_off, row_off = int(np.floor(bounds.col_off)), int(np.floor(bounds.row_off))
+            zone_window = Window(col_off, row_off,
+                                 int(np.ceil(bounds.col_off + bounds.width)) - col_off,
+                                 int(np.ceil(bounds.row_off + bounds.height)) - row_off)
+            if not rasterio.windows.intersect([zone_window, full_window]):
+                return counts_to_dataframe(bin_counts)
+
+        for _, window in src.block_windows(band):
+            if zone_window is not None and not rasterio.windows.intersect([window, zone_window]):
+                continue
+            block = src.read(band, window=window, masked=True)
+            if geometry is None:
+                values = block.compressed()
+            else:
+                inside = geometry_mask([geometry], out_shape=block.shape, transform=src.window_transform(window), invert=True)
+                values = block.data[inside & ~np.ma.getmaskarray(block)]
+            indices = aspect_bin_indices(values)
+            bin_counts += np.bincount(indices[indices >= 0], minlength=len(ASPECT_BIN_CATEGORIES))
+    return counts_to_dataframe(bin_counts)
+
+
+def table_category_counts(file_path, chunksize=DEFAULT_CHUNKSIZE, intermediate_file=None):
+    """
+    Reads a histogram table in chunks and sums its 'count' column for each aspect category.
+
+    Parameters:
+    file_path (str): The path to the CSV, Excel or Parquet file.
+    chunksize (int): The number of rows read at a time.
+    intermediate_file (str, optional): A Parquet file to stream the 'value' and 'category' of every row to.
+
+    Returns:
+    DataFrame: A DataFrame with 'category' and 'count' columns.
+    """
+    totals = pd.Series(0, index=ASPECT_CATEGORIES, dtype=np.int64)
+    writer = pq.ParquetWriter(intermediate_file, INTERMEDIATE_SCHEMA) if intermediate_file else None
+    try:
+        for chunk in read_file(file_path, chunksize):
+            with stage('map_chunk', rows=len(chunk)):
+                chunk = map_values_to_categories(chunk)
+            totals = totals + chunk.groupby('category')['count'].sum().reindex(ASPECT_CATEGORIES, fill_value=0)
+            if writer is not None:
+                columns = chunk[['value', 'category']].astype({'value': 'float64', 'category': 'category'})
+                writer.write_table(pa.Table.from_pandas(columns, schema=INTERMEDIATE_SCHEMA, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+    return pd.DataFrame({'category': totals.index, 'count': totals.to_numpy()})
+
+
 def calculate_category_percentages(dataframe):
     """
     Groups the dataframe by 'category' and calculates the sum and percentage of 'count' for each category.
@@ -59,30 +223,111 @@ def calculate_category_percentages(dataframe):
     return result
 
 
+def batch_category_counts(input_file, zone=None, geometry=None, zone_crs=None):
+    """
+    Computes the category percentages for one input, or one zone of one raster input. Runs in a worker process.
+
+    Parameters:
+    input_file (str): The path to the raster or table.
+    zone (object, optional): The identifier of the zone.
+    geometry (Geometry, optional): The zone geometry.
+    zone_crs (str, optional): The CRS of the zone geometry.
+
+    Returns:
+    DataFrame: The category counts and percentages, labelled with the input and zone.
+    """
+    if geometry is not None:
+        with rasterio.open(input_file) as src:
+            raster_crs = src.crs
+        if raster_crs is not None:
+            geometry = gpd.GeoSeries([geometry], crs=zone_crs).to_crs(raster_crs).iloc[0]
+        counts = raster_category_counts(input_file, geometry=geometry)
+    elif is_raster(input_file):
+        counts = raster_category_counts(input_file)
+    else:
+        counts = table_category_counts(input_file)
+
+    result = calculate_category_percentages(counts)
+    result.insert(0, 'zone', zone)
+    result.insert(0, 'input', input_file)
+    return result
+
+
+def run_batch(input_pattern, final_file, zones_file=None, zone_field=None, jobs=None):
+    """
+    Computes category percentages for every input matching a glob pattern, optionally per zone, in a process pool
+    and writes them to one consolidated table.
+
+    Parameters:
+    input_pattern (str): A glob pattern matching the rasters or tables to process.
+    final_file (str): The consolidated output table, Parquet if it ends in .parquet and CSV otherwise.
+    zones_file (str, optional): A polygon layer whose features are processed as separate zones of every raster.
+    zone_field (str, optional): The zone layer attribute used to label zones. Defaults to the feature index.
+    jobs (int, optional): The number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    DataFrame: The consolidated results.
+    """
+    input_files = sorted(glob.glob(input_pattern, recursive=True))
+    if not input_files:
+        raise FileNotFoundError(f"No files match {input_pattern}")
+
+    tasks = []
+    if zones_file:
+        zones = gpd.read_file(zones_file)
+        if zones.crs is None:
+            raise ValueError(f"The zone layer has no coordinate system, define one (for example a .prj file): {zones_file}")
+        zone_ids = zones[zone_field] if zone_field else zones.index
+        zone_crs = zones.crs.to_wkt()
+        for input_file in input_files:
+            if not is_raster(input_file):
+                raise ValueError(f"Zones can only be applied to rasters: {input_file}")
+            for zone, geometry in zip(zone_ids, zones.geometry):
+                tasks.append((input_file, zone, geometry, zone_crs))
+    else:
+        tasks = [(input_file, None, None, None) for input_file in input_files]
+
+    print(f"Processing {len(tasks)} tasks from {len(input_files)} inputs.")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(batch_category_counts, *zip(*tasks)))
+
+    result = pd.concat(results, ignore_index=True)
+    if not zones_file:
+        result = result.drop(columns=['zone'])
+    if final_file.endswith('.parquet'):
+        result.to_parquet(final_file, index=False)
+    else:
+        result.to_csv(final_file, index=False)
+    return result
+
+
 def main(args):
     """
     Main function that reads the input file, maps values to categories, calculates category percentages,
-    and writes the results to the output files.
+    and writes the results to the output files. Tables are streamed in chunks. The optional intermediate
+    Parquet file holds every mapped row for tables and the per-category counts for rasters.
 
     Parameters:
     args (Namespace): The command-line arguments.
     """
-    category_mapping = {
-        -1: 'flat',
-        **{value: 'north' for value in range(0, 23)},
-        **{value: 'northeast' for value in range(23, 68)},
-        **{value: 'east' for value in range(68, 113)},
-        **{value: 'southeast' for value in range(113, 158)},
-        **{value: 'south' for value in range(158, 203)},
-        **{value: 'southwest' for value in range(203, 248)},
-        **{value: 'west' for value in range(248, 293)},
-        **{value: 'northwest' for value in range(293, 338)},
-        **{value: 'north' for value in range(338, 361)}
-    }
-
-    dataframe = read_file(args.input_file)
-    dataframe = map_values_to_categories(dataframe, category_mapping)
-    dataframe[['value', 'category']].to_csv(args.intermediate_file, index=False)
+    if args.batch:
+        with stage('batch') as batch_stage:
+            result = run_batch(args.input_file, args.final_file, args.zones, args.zone_field, args.jobs)
+            batch_stage.add(pixels=int(result['count'].sum()))
+        if args.intermediate_file:
+            result.drop(columns=['percentage']).to_parquet(args.intermediate_file, index=False)
+        print(f"Wrote {len(result)} rows to {args.final_file}")
+        return
+
+    if is_raster(args.input_file):
+        with stage('raster_counts') as counts_stage:
+            dataframe = raster_category_counts(args.input_file)
+            counts_stage.add(pixels=int(dataframe['count'].sum()))
+        if args.intermediate_file:
+            dataframe.to_parquet(args.intermediate_file, index=False)
+    else:
+        with stage('table_counts'):
+            dataframe = table_category_counts(args.input_file, args.chunksize, args.intermediate_file)
     result = calculate_category_percentages(dataframe)
     result_str = result.to_string(index=False, formatters={'count': '{:,}'.format, 'percentage': '{:.2f}%'.format})
     with open(args.final_file, 'w') as f:
@@ -91,9 +336,16 @@ def main(args):
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process a CSV or Excel file and calculate category percentages.")
-    parser.add_argument('input_file', metavar='input_file', type=str, help='Input CSV or Excel file.')
-    parser.add_argument('intermediate_file', metavar='intermediate_file', type=str, help='Output CSV file for intermediate results.')
-    parser.add_argument('final_file', metavar='final_file', type=str, help='Output text file for final results.')
+    parser = argparse.ArgumentParser(description="Process a CSV or Excel file, or an aspect raster, and calculate category percentages.")
+    parser.add_argument('input_file', metavar='input_file', type=str, help='Input CSV or Excel file, or an aspect raster (.tif, .img, .vrt). A glob pattern with --batch.')
+    parser.add_argument('final_file', metavar='final_file', type=str, help='Output text file for final results. A .csv or .parquet table with --batch.')
+    parser.add_argument('--intermediate_file', metavar='intermediate_file', type=str, help='optional Parquet file for intermediate results, for debugging')
+    parser.add_argument('--chunksize', metavar='chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='rows of the input table read at a time')
+    parser.add_argument('--batch', action='store_true', help='process every file matching input_file in parallel and write one consolidated table')
+    parser.add_argument('--zones', metavar='zones', type=str, help='with --batch, polygon layer of zones to summarize each raster by')
+    parser.add_argument('--zone_field', metavar='zone_field', type=str, help='zone attribute used to label results, defaults to the feature index')
+    parser.add_argument('--jobs', metavar='jobs', type=int, default=os.cpu_count(), help='number of worker processes for --batch')
+    add_profile_argument(parser)
     args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    with profiling(args.profile, 'raster_histo'):
+        main(args)
\ No newline at end of file
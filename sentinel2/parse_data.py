@@ -1,10 +1,13 @@
 import os
+import sys
 import argparse
 from osgeo import gdal, ogr, osr
 from shapely.wkt import loads
-import geopandas as gpd
 import numpy as np
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import add_profile_argument, profiling, stage
+from common.vector_io import read_vector
 
 """
 This script is used for processing raster data based on an Area of Interest (AOI). It includes functions to load the AOI, find rasters that intersect with the AOI, and extract specific values from those rasters to create new rasters.
@@ -23,12 +26,12 @@ The script is executed from the command line and requires the os, argparse, osge
 
 def load_aoi(aoi_file):
     """
-    Loads an Area of Interest (AOI) from a file.
+    Loads an Area of Interest (AOI) from a file. Only its geometry is read.
 
     :param aoi_file: The path to the AOI file.
     :return: A GeoDataFrame containing the AOI.
     """
-    return gpd.read_file(aoi_file)
+    return read_vector(aoi_file, columns=[])
 
 
 def get_intersecting_rasters(raster_folder, aoi):
@@ -83,7 +86,8 @@ def extract_values_and_create_new_raster(raster_folder, output_folder, intersect
 
         # Open raster dataset
         raster_ds = gdal.Open(raster_path)
-        raster_array = raster_ds.ReadAsArray()
+        with stage('read', pixels=raster_ds.RasterXSize * raster_ds.RasterYSize):
+            raster_array = raster_ds.ReadAsArray()
 
         # Specify values to extract
         specific_values = [2]
@@ -93,8 +97,9 @@ def extract_values_and_create_new_raster(raster_folder, output_folder, intersect
         extracted_array.fill(raster_ds.GetRasterBand(1).GetNoDataValue())  # Fill with nodata initially
 
         # Extract specified values
-        for value in specific_values:
-            extracted_array[np.where(raster_array == value)] = value
+        with stage('extract', pixels=raster_array.size):
+            for value in specific_values:
+                extracted_array[np.where(raster_array == value)] = value
 
         # Create new raster file
         driver = gdal.GetDriverByName('GTiff')
@@ -133,8 +138,10 @@ def main(**args):
 
     :param args: A dictionary of arguments, including 'aoi_file', 'raster_folder', 'output_folder', and 'specific_values'.
     """
-    aoi = load_aoi(args['aoi_file'])
-    intersecting_rasters = get_intersecting_rasters(args['raster_folder'], aoi)
+    with stage('load_aoi'):
+        aoi = load_aoi(args['aoi_file'])
+    with stage('find_rasters'):
+        intersecting_rasters = get_intersecting_rasters(args['raster_folder'], aoi)
     print(f"Intersecting rasters: {intersecting_rasters}")
 
     extract_values_and_create_new_raster(args['raster_folder'], args['output_folder'], intersecting_rasters, args['specific_values'])
@@ -146,6 +153,8 @@ if __name__ == "__main__":
     parser.add_argument('raster_folder', metavar='raster_folder', type=str, help='input raster folder from sentinel2 data as path')
     parser.add_argument('output_folder', metavar='output_folder', type=str, help='where to dump data')
     parser.add_argument('--specific_values', metavar='specific_values', type=int, nargs='+', default=[2], help='values to extract from raster')
+    add_profile_argument(parser)
 
-    args = parser.parse_args()
-    main(**vars(args))
+    args = vars(parser.parse_args())
+    with profiling(args.pop('profile'), 'parse_data'):
+        main(**args)
@@ -8,38 +8,52 @@ from rasterio.features import shapes
 from shapely.geometry import shape
 import pandas as pd
 import argparse
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import add_profile_argument, profiling, stage
+from common.vector_io import DEFAULT_FORMAT, FORMATS, output_path, read_vector, write_vector
 
 
 def read_aoi(inshp):
     """
-    Reads an Area of Interest (AOI) from a shapefile.
+    Reads an Area of Interest (AOI) from a shapefile or any other vector file. Only its geometry is read.
 
-    :param inshp: The path to the shapefile.
+    :param inshp: The path to the AOI file.
     :return: A GeoDataFrame containing the AOI.
     """
-    aoi = gpd.read_file(inshp)
+    aoi = read_vector(inshp, columns=[])
     return aoi
 
 
-def merge_shapefiles(output_dir):
+def merge_shapefiles(output_dir, output_format=DEFAULT_FORMAT):
     """
-    Merges all shapefiles in a directory into a single shapefile.
+    Merges the polygon files in a directory into a single file.
 
-    :param output_dir: The directory containing the shapefiles.
+    :param output_dir: The directory containing the polygon files.
+    :param output_format: The format of the polygon files and of the merged file, one of FORMATS.
     """
-    shapefiles = [os.path.join(output_dir, filename) for filename in os.listdir(output_dir) if filename.endswith('.shp')]
-    gdfs = [gpd.read_file(shp) for shp in shapefiles]
+    suffix = os.path.basename(output_path('', '_polygons', output_format))
+    polygon_files = [os.path.join(output_dir, filename) for filename in os.listdir(output_dir) if filename.endswith(suffix)]
+    if not polygon_files:
+        print(f"No polygon files found in {output_dir}. Skipping merge.")
+        return
+    gdfs = [read_vector(polygon_file) for polygon_file in polygon_files]
     merged_gdf = gpd.GeoDataFrame(pd.concat(gdfs, ignore_index=True))
-    merged_gdf.to_file(os.path.join(output_dir, 'merged.shp'))
+    merged_path = output_path(output_dir, 'merged', output_format)
+    if os.path.exists(merged_path):
+        os.remove(merged_path)
+    write_vector(merged_gdf, merged_path)
 
 
-def raster_to_polygons(raster_path, output_dir):
+def raster_to_polygons(raster_path, output_dir, output_format=DEFAULT_FORMAT):
     """
-    Converts a raster to polygons and saves the polygons to a new shapefile.
+    Converts a raster to polygons and saves the polygons to a new file.
 
     :param raster_path: The path to the raster.
-    :param output_dir: The directory to save the new shapefile in.
-    :return: The path to the new shapefile.
+    :param output_dir: The directory to save the new file in.
+    :param output_format: The format of the new file, one of FORMATS.
+    :return: The path to the new file.
     """
     # Convert the raster to polygons
     with rasterio.open(raster_path) as src:
@@ -57,10 +71,12 @@ def raster_to_polygons(raster_path, output_dir):
     gdf = gpd.GeoDataFrame.from_features(geoms)
     gdf.crs = src.crs
 
-    # Save polygons to a new shapefile
-    filename = os.path.basename(raster_path)
-    polygon_path = os.path.join(output_dir, filename.replace('.tif', '_polygons.shp'))
-    gdf.to_file(polygon_path)
+    # Save polygons to a new file
+    filename = os.path.splitext(os.path.basename(raster_path))[0]
+    polygon_path = output_path(output_dir, f"{filename}_polygons", output_format)
+    if os.path.exists(polygon_path):
+        os.remove(polygon_path)
+    write_vector(gdf, polygon_path)
 
     return polygon_path
 
@@ -128,26 +144,33 @@ def mask_raster_with_aoi(raster_path, aoi, output_dir):
     return masked_raster_path
 
 
-def main(dirpath, inshp, output_dir):
+def main(dirpath, inshp, output_dir, output_format=DEFAULT_FORMAT):
     """
     Main function to read an AOI, reproject and mask rasters to match the AOI, convert the masked rasters to polygons, 
-    and merge all resulting shapefiles.
+    and merge all resulting polygon files.
 
     :param dirpath: The directory containing the rasters.
-    :param inshp: The path to the AOI shapefile.
+    :param inshp: The path to the AOI file.
     :param output_dir: The directory to save the output files in.
+    :param output_format: The format of the polygon files, one of FORMATS.
     """
-    aoi = read_aoi(inshp)
+    with stage('read_aoi'):
+        aoi = read_aoi(inshp)
     aoi_crs = aoi.crs.to_string()
 
     for filename in os.listdir(dirpath):
         if filename.endswith('.tif'):
             raster_path = os.path.join(dirpath, filename)
-            reprojected_raster_path = reproject_raster_to_match_aoi(raster_path, aoi_crs, output_dir)
+            with rasterio.open(raster_path) as src:
+                pixels = src.width * src.height
+            with stage('reproject', pixels=pixels):
+                reprojected_raster_path = reproject_raster_to_match_aoi(raster_path, aoi_crs, output_dir)
 
             try:
-                masked_raster_path = mask_raster_with_aoi(reprojected_raster_path, aoi, output_dir)
-                polygon_path = raster_to_polygons(masked_raster_path, output_dir)
+                with stage('mask', pixels=pixels):
+                    masked_raster_path = mask_raster_with_aoi(reprojected_raster_path, aoi, output_dir)
+                with stage('polygonize'):
+                    polygon_path = raster_to_polygons(masked_raster_path, output_dir, output_format)
             except ValueError as e:
                 if 'Input shapes do not overlap raster.' in str(e):
                     print(f"No overlap between {filename} and the AOI. Skipping masking process.")
@@ -155,7 +178,8 @@ def main(dirpath, inshp, output_dir):
                     raise e
 
     print('Export of intersected files complete')
-    merge_shapefiles(output_dir)
+    with stage('merge'):
+        merge_shapefiles(output_dir, output_format)
 
 
 if __name__ == "__main__":
@@ -163,6 +187,9 @@ if __name__ == "__main__":
     parser.add_argument('dirpath', metavar='dirpath', type=str, help='The directory containing the rasters.')
     parser.add_argument('inshp', metavar='inshp', type=str, help='The path to the AOI shapefile.')
     parser.add_argument('output_dir', metavar='output_dir', type=str, help='The directory to save the output files in.')
+    parser.add_argument('--output_format', metavar='output_format', type=str, choices=list(FORMATS), default=DEFAULT_FORMAT, help='The format of the polygon files: gpkg (default), fgb, parquet or shp.')
+    add_profile_argument(parser)
     args = parser.parse_args()
 
-    main(args.dirpath, args.inshp, args.output_dir)
+    with profiling(args.profile, 'raster_mask'):
+        main(args.dirpath, args.inshp, args.output_dir, args.output_format)
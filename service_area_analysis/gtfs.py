@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+"""
+This module builds geometries from a GTFS feed. Route shapes are read from shapes.txt with only the columns needed,
+sorted by shape_id and shape_pt_sequence, and built into one LineString per shape_id with a single call to shapely's
+vectorized linestrings constructor. Stops are read from stops.txt into points.
+"""
+
+SHAPE_COLUMNS = ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence']
+SHAPE_DTYPES = {'shape_id': str, 'shape_pt_lat': np.float64, 'shape_pt_lon': np.float64, 'shape_pt_sequence': np.int64}
+GTFS_CRS = "EPSG:4326"
+
+
+def read_gtfs_table(path, usecols=None, dtype=None):
+    """
+    Reads a GTFS table. Columns left out of usecols are skipped by the parser rather than read and dropped.
+
+    Parameters:
+    path (str): The path to the table.
+    usecols (list, optional): The columns to read. Defaults to all columns.
+    dtype (dict, optional): The dtypes of the columns.
+
+    Returns:
+    DataFrame: The table.
+    """
+    return pd.read_csv(path, usecols=usecols, dtype=dtype, skipinitialspace=True)
+
+
+def shape_linestrings(shapes):
+    """
+    Builds one LineString per shape_id from shape points, in shape_pt_sequence order. Shapes with fewer than two
+    points are skipped.
+
+    Parameters:
+    shapes (DataFrame): The shape points, with the columns of shapes.txt.
+
+    Returns:
+    GeoDataFrame: The shapes, with a shape_id column, in EPSG:4326.
+    """
+    shapes = shapes.sort_values(['shape_id', 'shape_pt_sequence'], kind='stable')
+    codes, shape_ids = pd.factorize(shapes['shape_id'])
+    keep = (np.bincount(codes) >= 2)[codes]
+    codes, shape_ids = pd.factorize(shapes['shape_id'][keep])
+
+    coordinates = shapes[['shape_pt_lon', 'shape_pt_lat']].to_numpy()[keep]
+    lines = shapely.linestrings(coordinates, indices=codes)
+    return gpd.GeoDataFrame({'shape_id': shape_ids}, geometry=lines, crs=GTFS_CRS)
+
+
+def read_shapes(gtfs_folder):
+    """
+    Reads the route shapes of a GTFS feed.
+
+    Parameters:
+    gtfs_folder (str): The folder containing the GTFS feed.
+
+    Returns:
+    GeoDataFrame: One LineString per shape_id.
+    """
+    shapes = read_gtfs_table(os.path.join(gtfs_folder, "shapes.txt"), SHAPE_COLUMNS, SHAPE_DTYPES)
+    return shape_linestrings(shapes)
+
+
+def read_stops(gtfs_folder):
+    """
+    Reads the stops of a GTFS feed.
+
+    Parameters:
+    gtfs_folder (str): The folder containing the GTFS feed.
+
+    Returns:
+    GeoDataFrame: The stops as points, with all columns of stops.txt.
+    """
+    stops = read_gtfs_table(os.path.join(gtfs_folder, "stops.txt"), dtype={'stop_id': str})
+    return gpd.GeoDataFrame(stops, geometry=gpd.points_from_xy(stops['stop_lon'], stops['stop_lat']), crs=GTFS_CRS)
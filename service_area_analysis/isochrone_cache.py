@@ -0,0 +1,88 @@
+import json
+import sqlite3
+import threading
+
+"""
+This module keeps an on-disk SQLite cache of isochrones, so reruns over mostly unchanged stops only request the
+isochrones of new or moved stops. Each entry holds the GeoJSON features returned for one location, including their
+total_pop and other attributes, and is keyed by the server that computed it, the location's coordinates rounded to
+about a meter, the routing profile, the ranges and the requested attributes, so isochrones from a self-hosted or stub
+server are never served for the public API or the other way round. The cache can be written from several request
+threads at once.
+"""
+
+DEFAULT_CACHE_PATH = "isochrone_cache.sqlite"
+COORDINATE_DECIMALS = 5
+PUBLIC_API_URL = "https://api.openrouteservice.org"
+
+
+def cache_key(location, profile, ranges, attributes, base_url=None):
+    """
+    Builds the cache key of one location's isochrones.
+
+    Parameters:
+    location (list): The [lon, lat] of the location.
+    profile (str): The routing profile.
+    ranges (list): The isochrone ranges.
+    attributes (list): The requested attributes.
+    base_url (str, optional): The URL of the server the isochrones are requested from. Defaults to the public API.
+
+    Returns:
+    str: The cache key.
+    """
+    server = (base_url or PUBLIC_API_URL).rstrip('/')
+    lon, lat = (round(float(coordinate), COORDINATE_DECIMALS) for coordinate in location)
+    return json.dumps([server, lon, lat, profile, list(ranges), sorted(attributes)])
+
+
+class IsochroneCache:
+    """
+    A SQLite cache mapping cache keys to the isochrone features of one location.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS isochrones (key TEXT PRIMARY KEY, features TEXT NOT NULL)"
+            )
+
+    def get_many(self, keys):
+        """
+        Looks up the features of several locations.
+
+        Parameters:
+        keys (list): The cache keys.
+
+        Returns:
+        dict: A mapping of the cached keys to their lists of GeoJSON features. Keys that are not cached are left out.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, features FROM isochrones WHERE key IN ({', '.join('?' * len(batch))})", batch
+                )
+                found.update((key, json.loads(features)) for key, features in rows)
+        return found
+
+    def put_many(self, features_by_key):
+        """
+        Stores the features of several locations, replacing any cached features for the same keys.
+
+        Parameters:
+        features_by_key (dict): A mapping of cache keys to lists of GeoJSON features.
+        """
+        rows = [(key, json.dumps(features)) for key, features in features_by_key.items()]
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO isochrones (key, features) VALUES (?, ?)", rows)
+
+    def close(self):
+        """
+        Closes the cache database.
+        """
+        self._connection.close()
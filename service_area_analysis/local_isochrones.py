@@ -0,0 +1,170 @@
+import os
+import sys
+import threading
+import numpy as np
+import geopandas as gpd
+import shapely
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.vector_io import read_vector
+
+"""
+This module computes isochrones offline from a local walking network instead of the OpenRouteService API. The
+network is read from an OSM extract (the highway lines of GDAL's OSM driver) or from any line file of edges,
+projected to its UTM zone, and turned into a sparse graph whose nodes are the line vertices and whose edge weights
+are segment lengths in meters. Stops are snapped to their nearest node with a KD-tree, travel distance trees are
+grown from batches of stops at once with scipy's Dijkstra, limited to the largest range, and the nodes reached
+within each range are wrapped in a concave hull and buffered to cover the ground either side of the paths.
+
+Ranges are in seconds, like the API's, and are converted to distances with a nominal speed per profile. The local
+backend has no population data, so its isochrones have no total_pop.
+"""
+
+PROFILE_SPEEDS = {  # Nominal speeds in meters per second
+    'foot-walking': 1.4,
+    'foot-hiking': 1.2,
+    'wheelchair': 1.0,
+    'cycling-regular': 4.2,
+}
+OSM_EXTENSIONS = ('.osm', '.pbf')
+EXCLUDED_HIGHWAYS = ['motorway', 'motorway_link', 'trunk', 'trunk_link', 'construction', 'proposed']
+NODE_DECIMALS = 2  # Vertices closer than a centimeter are the same node
+MIN_EDGE_LENGTH = 0.001
+MAX_SNAP_DISTANCE = 500.0
+CONCAVE_HULL_RATIO = 0.3
+BUFFER_DISTANCE = 50.0
+MAX_BATCH_CELLS = 50_000_000  # Distance matrix entries per Dijkstra batch, about 400 MB
+
+_networks = {}
+_networks_lock = threading.Lock()
+
+
+def read_network_lines(network_path, layer=None):
+    """
+    Reads the lines of a walking network. OSM extracts are read through GDAL's OSM driver, keeping the highways that
+    can be walked; only the geometry of other files is read.
+
+    Parameters:
+    network_path (str): The path to an OSM extract (.osm or .osm.pbf) or a line file of edges.
+    layer (str, optional): The layer to read from a line file.
+
+    Returns:
+    GeoSeries: The network lines.
+    """
+    if network_path.lower().endswith(OSM_EXTENSIONS):
+        lines = gpd.read_file(network_path, layer='lines')
+        lines = lines[lines['highway'].notna() & ~lines['highway'].isin(EXCLUDED_HIGHWAYS)]
+    else:
+        lines = read_vector(network_path, columns=[], layer=layer)
+    return lines.geometry
+
+
+def build_network(lines):
+    """
+    Builds an undirected graph from network lines, with a node at every vertex and an edge along every segment.
+
+    Parameters:
+    lines (GeoSeries): The network lines, with a CRS.
+
+    Returns:
+    dict: The graph as a CSR matrix of segment lengths in meters, the node coordinates, a KD-tree of the nodes and
+    the projected CRS of the coordinates.
+    """
+    crs = lines.estimate_utm_crs()
+    lines = lines.to_crs(crs).explode(ignore_index=True)
+    coordinates, line_index = shapely.get_coordinates(lines.values, return_index=True)
+
+    # Give vertices shared by several lines the same node
+    nodes, node_ids = np.unique(np.round(coordinates, NODE_DECIMALS), axis=0, return_inverse=True)
+    node_ids = node_ids.ravel()
+
+    # Connect consecutive vertices of the same line, keeping the shortest of any parallel segments
+    same_line = line_index[1:] == line_index[:-1]
+    u, v = node_ids[:-1][same_line], node_ids[1:][same_line]
+    lengths = np.hypot(*(coordinates[1:] - coordinates[:-1])[same_line].T)
+    a, b = np.minimum(u, v)[u != v], np.maximum(u, v)[u != v]
+    lengths = np.maximum(lengths[u != v], MIN_EDGE_LENGTH)
+    order = np.lexsort((lengths, b, a))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (a[order][1:] != a[order][:-1]) | (b[order][1:] != b[order][:-1])
+    keep = order[first]
+
+    graph = coo_matrix((lengths[keep], (a[keep], b[keep])), shape=(len(nodes), len(nodes))).tocsr()
+    return {'graph': graph, 'nodes': nodes, 'tree': cKDTree(nodes), 'crs': crs}
+
+
+def load_network(network_path, layer=None):
+    """
+    Gets the network built from a file, building it on first use and reusing it for later calls.
+
+    Parameters:
+    network_path (str): The path to an OSM extract or a line file of edges.
+    layer (str, optional): The layer to read from a line file.
+
+    Returns:
+    dict: The network, as returned by build_network.
+    """
+    key = (os.path.abspath(network_path), layer)
+    with _networks_lock:
+        if key not in _networks:
+            _networks[key] = build_network(read_network_lines(network_path, layer))
+        return _networks[key]
+
+
+def isochrone_polygon(points):
+    """
+    Wraps the nodes reached within a range in a buffered concave hull.
+
+    Parameters:
+    points (ndarray): The coordinates of the reached nodes.
+
+    Returns:
+    Polygon: The isochrone polygon.
+    """
+    hull = shapely.concave_hull(shapely.multipoints(points), ratio=CONCAVE_HULL_RATIO)
+    return shapely.buffer(hull, BUFFER_DISTANCE)
+
+
+def local_isochrones(coordinates, network, ranges, profile='foot-walking'):
+    """
+    Computes isochrones around locations on a local network. Locations farther than MAX_SNAP_DISTANCE from the
+    network get no isochrones.
+
+    Parameters:
+    coordinates (list): A list of [lon, lat] coordinates.
+    network (dict): The network, as returned by load_network.
+    ranges (list): The isochrone ranges, in seconds.
+    profile (str): The profile, which sets the travel speed.
+
+    Returns:
+    GeoDataFrame: The isochrones in EPSG:4326, with value and stop_index columns, ordered by stop and range.
+    """
+    if profile not in PROFILE_SPEEDS:
+        raise ValueError(f"No travel speed for profile {profile!r}, expected one of {list(PROFILE_SPEEDS)}")
+    reach = np.asarray(ranges, dtype=float) * PROFILE_SPEEDS[profile]
+
+    points = gpd.GeoSeries(gpd.points_from_xy(*np.asarray(coordinates, dtype=float).reshape(-1, 2).T), crs='EPSG:4326')
+    snap_distances, sources = network['tree'].query(shapely.get_coordinates(points.to_crs(network['crs']).values))
+    snapped = np.flatnonzero(snap_distances <= MAX_SNAP_DISTANCE)
+    if len(snapped) < len(points):
+        print(f"{len(points) - len(snapped)} stops are more than {MAX_SNAP_DISTANCE} m from the network.")
+
+    values, stop_indices, geometries = [], [], []
+    batch_size = max(1, MAX_BATCH_CELLS // max(len(network['nodes']), 1))
+    for start in range(0, len(snapped), batch_size):
+        batch = snapped[start:start + batch_size]
+        distances = dijkstra(network['graph'], directed=False, indices=sources[batch], limit=reach.max())
+        for row, stop_index in enumerate(batch):
+            for value, meters in zip(ranges, reach):
+                reached = network['nodes'][distances[row] <= meters - snap_distances[stop_index]]
+                if len(reached) == 0:
+                    continue
+                values.append(value)
+                stop_indices.append(stop_index)
+                geometries.append(isochrone_polygon(reached))
+
+    gdf = gpd.GeoDataFrame({'value': values, 'stop_index': stop_indices}, geometry=geometries, crs=network['crs'])
+    return gdf.to_crs('EPSG:4326')
@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+This script runs a local stand-in for the OpenRouteService isochrones endpoint, so service_area_analysis can be run
+and timed without an API key or quota. It answers POST /v2/isochrones/{profile}/geojson like ORS does, with one
+feature per location and range: a square around the location sized by the range and a nominal profile speed, with
+ORS's group_index, value and center properties and a synthetic total_pop when requested. It can add latency and
+answer a share of requests with 429 or 503 errors to exercise rate limiting and retries.
+
+Point an openrouteservice client at it with base_url, e.g. openrouteservice.Client(base_url='http://localhost:8080').
+"""
+
+ISOCHRONE_PATH = re.compile(r'^/v2/isochrones/(?P<profile>[^/]+)/geojson$')
+METERS_PER_DEGREE = 111320.0
+PROFILE_SPEEDS = {  # Nominal speeds in meters per second
+    'foot-walking': 1.4,
+    'foot-hiking': 1.2,
+    'cycling-regular': 4.2,
+    'driving-car': 11.0,
+}
+DEFAULT_SPEED = 1.4
+PEOPLE_PER_SQUARE_KM = 2500
+
+
+def isochrone_feature(location, value, group_index, profile, range_type, attributes):
+    """
+    Builds a square isochrone feature around a location.
+
+    Parameters:
+    location (list): The [lon, lat] of the location.
+    value (float): The range, in seconds for time ranges or meters for distance ranges.
+    group_index (int): The index of the location in the request.
+    profile (str): The routing profile.
+    range_type (str): 'time' or 'distance'.
+    attributes (list): The requested attributes.
+
+    Returns:
+    dict: A GeoJSON feature.
+    """
+    lon, lat = location
+    reach = value * PROFILE_SPEEDS.get(profile, DEFAULT_SPEED) if range_type == 'time' else value
+    dy = reach / METERS_PER_DEGREE
+    dx = dy / max(math.cos(math.radians(lat)), 1e-6)
+    ring = [[lon - dx, lat - dy], [lon + dx, lat - dy], [lon + dx, lat + dy], [lon - dx, lat + dy], [lon - dx, lat - dy]]
+
+    properties = {'group_index': group_index, 'value': value, 'center': [lon, lat]}
+    if 'area' in attributes:
+        properties['area'] = (2 * reach) ** 2
+    if 'total_pop' in attributes:
+        properties['total_pop'] = round((2 * reach / 1000) ** 2 * PEOPLE_PER_SQUARE_KM)
+    return {'type': 'Feature', 'properties': properties, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+class IsochroneHandler(BaseHTTPRequestHandler):
+    """
+    Handles isochrone requests. The server's latency, error_rate and error_status attributes control how it answers.
+    """
+
+    def do_POST(self):
+        match = ISOCHRONE_PATH.match(self.path.split('?')[0])
+        if match is None:
+            return self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with self.server.lock:
+            self.server.request_count += 1
+
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            return self.send_json(self.server.error_status, {'error': 'Stub error'})
+
+        profile = match.group('profile')
+        range_type = body.get('range_type', 'time')
+        attributes = body.get('attributes', [])
+        features = [isochrone_feature(location, value, group_index, profile, range_type, attributes)
+                    for group_index, location in enumerate(body.get('locations', []))
+                    for value in body.get('range', [])]
+        self.send_json(200, {'type': 'FeatureCollection', 'features': features, 'metadata': {'query': body}})
+
+    def send_json(self, status, payload):
+        """
+        Sends a JSON response.
+
+        Parameters:
+        status (int): The HTTP status code.
+        payload (dict): The response body.
+        """
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='localhost', port=8080, latency=0.0, error_rate=0.0, error_status=429, verbose=False):
+    """
+    Creates a stub isochrone server. Port 0 picks a free port.
+
+    Parameters:
+    host (str): The host to bind to.
+    port (int): The port to bind to.
+    latency (float): The delay added to every request, in seconds.
+    error_rate (float): The share of requests answered with error_status.
+    error_status (int): The HTTP status of injected errors.
+    verbose (bool): Whether to log every request.
+
+    Returns:
+    ThreadingHTTPServer: The server, with a request_count attribute counting isochrone requests.
+    """
+    server = ThreadingHTTPServer((host, port), IsochroneHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.verbose = verbose
+    server.request_count = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def serve_in_thread(**kwargs):
+    """
+    Starts a stub isochrone server on a background thread.
+
+    Parameters:
+    **kwargs: Arguments for make_server.
+
+    Returns:
+    tuple: The server and its base URL. Call server.shutdown() to stop it.
+    """
+    kwargs.setdefault('port', 0)
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenRouteService-compatible isochrone stub")
+    parser.add_argument('--host', type=str, default='localhost', help='host to bind to')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of delay added to every request')
+    parser.add_argument('--error_rate', type=float, default=0.0, help='share of requests answered with an error')
+    parser.add_argument('--error_status', type=int, default=429, help='HTTP status of injected errors')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.error_rate, args.error_status, args.verbose)
+    print(f"Serving stub isochrones on http://{args.host}:{server.server_address[1]}")
+    server.serve_forever()
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from openrouteservice import exceptions
+
+"""
+This module schedules OpenRouteService requests concurrently. A thread pool keeps several requests in flight while
+a shared rate limiter spaces their start times to stay within a requests-per-minute budget. Requests that fail with
+a rate limit (429), a server error (5xx), a timeout or a dropped connection are retried with exponential backoff and
+jitter, and results are returned in the order of their inputs.
+"""
+
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 20
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 2.0
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Spaces out the start of calls from any number of threads so that no more than requests_per_minute start per
+    minute. A requests_per_minute of None or 0 disables the limit.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def wait(self):
+        """
+        Blocks until the calling thread may start its next call.
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+def is_retryable(error):
+    """
+    Checks whether a failed request is worth retrying.
+
+    Parameters:
+    error (Exception): The error raised by the request.
+
+    Returns:
+    bool: True for rate limits, server errors, timeouts and connection errors.
+    """
+    if isinstance(error, exceptions.ApiError):
+        return error.status in RETRYABLE_STATUSES
+    if isinstance(error, exceptions.HTTPError):
+        return error.status_code in RETRYABLE_STATUSES
+    return isinstance(error, (exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def call_with_retry(func, item, limiter, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Calls a function within the rate limit, retrying retryable errors with exponential backoff and jitter.
+
+    Parameters:
+    func (callable): The function making the request.
+    item: The argument to call the function with.
+    limiter (RateLimiter): The rate limiter shared by all requests.
+    max_retries (int): The number of retries before the error is raised.
+    backoff (float): The delay before the first retry, in seconds. It doubles with each retry.
+
+    Returns:
+    The result of the function.
+    """
+    for attempt in range(max_retries + 1):
+        limiter.wait()
+        try:
+            return func(item)
+        except Exception as error:
+            if attempt == max_retries or not is_retryable(error):
+                raise
+            delay = backoff * 2 ** attempt * (0.5 + random.random())
+            print(f"Request failed ({error}), retrying in {delay:.1f} seconds.")
+            time.sleep(delay)
+
+
+def run_scheduled(func, items, workers=DEFAULT_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                  max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF):
+    """
+    Calls a function for every item concurrently, within a requests-per-minute budget and with retries.
+
+    Parameters:
+    func (callable): The function making one request.
+    items (list): The arguments to call the function with.
+    workers (int): The number of requests kept in flight.
+    requests_per_minute (int): The maximum number of requests started per minute. None or 0 for no limit.
+    max_retries (int): The number of retries of each request before its error is raised.
+    backoff (float): The delay before the first retry, in seconds.
+
+    Returns:
+    list: The results, in the order of the items.
+    """
+    limiter = RateLimiter(requests_per_minute)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda item: call_with_retry(func, item, limiter, max_retries, backoff), items))
@@ -1,20 +1,82 @@
 import openrouteservice
 import geopandas as gpd
 import pandas as pd
-import json
-from shapely.geometry import LineString
+import shapely
 import argparse
+import os
+import sys
+import threading
+
+from service_coverage import network_totals, summarize_coverage
+from gtfs import read_shapes, read_stops
+from isochrone_cache import DEFAULT_CACHE_PATH, IsochroneCache, cache_key
+from scheduler import DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_WORKERS, run_scheduled
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import add_profile_argument, profiling, stage
+from common.vector_io import write_vector
 
 """
 This script performs a service area analysis using the OpenRouteService API.
-It reads in a CSV file of points, creates isochrones around each point, and saves the results as a GeoPackage.
+It reads the stops of a GTFS feed, creates isochrones around each stop, and saves the results and the feed's route shapes as a GeoPackage.
+Isochrone requests run concurrently within a requests-per-minute budget, with retries on rate limits and transient errors.
+Isochrones are cached on disk by server, location, profile, ranges and attributes, so reruns only request new or moved stops.
+
+With --coverage, overlapping isochrones are dissolved and their population apportioned so network-wide totals do not double count.
+With --backend local, isochrones are computed offline from a walking network built from an OSM extract or edge file.
+
+Several profiles and ranges can be swept in one run; ranges share requests, and all requests run concurrently.
+
+The module can be imported and run_analysis called for any number of GTFS feeds from one process. Nothing runs at
+import; the OpenRouteService client is created on first use and reused, with its connection pool, by later calls.
 """
 
+PROFILE = 'foot-walking'
+RANGES = [900, 900]
+ATTRIBUTES = ['total_pop']
+CHUNK_SIZE = 5
+MAX_RANGES_PER_REQUEST = 10  # The most ranges OpenRouteService accepts in one isochrones request
+CREDS_PATH = "creds.txt"
 
-with open("creds.txt", 'r') as file:
-    api_key = file.readline().strip()
+_clients = {}
+_clients_lock = threading.Lock()
 
-client = openrouteservice.Client(key=api_key)
+
+def read_api_key(creds_path=CREDS_PATH):
+    """
+    Reads the OpenRouteService API key from the first line of a credentials file.
+
+    Parameters:
+    creds_path (str): The path to the credentials file.
+
+    Returns:
+    str: The API key.
+    """
+    with open(creds_path, 'r') as file:
+        return file.readline().strip()
+
+
+def get_client(api_key=None, base_url=None, creds_path=CREDS_PATH):
+    """
+    Gets the OpenRouteService client for an API key and server, creating it on first use. The client is shared by
+    later calls and request threads, so its HTTP connections are pooled and reused.
+
+    Parameters:
+    api_key (str, optional): The API key. Read from creds_path when not given and no base_url is set.
+    base_url (str, optional): The server URL, for a self-hosted or stub server. Defaults to the public API.
+    creds_path (str): The path to the credentials file.
+
+    Returns:
+    Client: The OpenRouteService client.
+    """
+    if api_key is None and base_url is None:
+        api_key = read_api_key(creds_path)
+    with _clients_lock:
+        if (api_key, base_url) not in _clients:
+            options = {'base_url': base_url} if base_url else {}
+            # Rate limits are retried by the request scheduler, so the client raises them instead of retrying on its own
+            _clients[(api_key, base_url)] = openrouteservice.Client(key=api_key, retry_over_query_limit=False, **options)
+        return _clients[(api_key, base_url)]
 
 
 def chunks(lst, n):
@@ -48,22 +110,6 @@ def input_csv(csv):
     return df
 
 
-def linestring(df):
-    """
-    Converts a GeoDataFrame of points into a LineString.
-
-    Parameters:
-    df (GeoDataFrame): The GeoDataFrame of points.
-
-    Returns:
-    GeoDataFrame: A GeoDataFrame containing a single LineString.
-    """
-    df = LineString( [[a.x, a.y] for a in df.geometry.values])
-    line_df = pd.DataFrame()
-    line_gdf = gpd.GeoDataFrame(line_df, geometry=[lineStringObj,])
-    return line_gdf
-
-
 def read_csv_to_gdf(csv_file, lon_col, lat_col):
     """
     Reads a CSV file into a GeoDataFrame.
@@ -81,66 +127,216 @@ def read_csv_to_gdf(csv_file, lon_col, lat_col):
     return gdf
 
 
-def get_isochrones(coordinates_chunks):
+def request_isochrones(client, chunk, profile=PROFILE, ranges=RANGES, attributes=ATTRIBUTES):
     """
-    Makes API requests to get isochrones and processes the responses.
+    Makes one API request for the isochrones of a chunk of coordinates.
 
     Parameters:
-    coordinates_chunks (list): A list of chunks of coordinates.
+    client (Client): The OpenRouteService client.
+    chunk (list): A list of [lon, lat] coordinates.
+    profile (str): The routing profile.
+    ranges (list): The isochrone ranges, in seconds.
+    attributes (list): The attributes to request.
 
     Returns:
-    GeoDataFrame: A GeoDataFrame containing the isochrones.
+    dict: The GeoJSON response.
     """
-    gdfs = []
-
-    for chunk in coordinates_chunks:
-        iso = client.isochrones(
-            locations=chunk,
-            profile='foot-walking',
-            range=[900, 900],
-            validate=False,
-            attributes=['total_pop']
-        )
+    return client.isochrones(
+        locations=chunk,
+        profile=profile,
+        range=ranges,
+        validate=False,
+        attributes=attributes
+    )
 
-        output_iso = json.loads(json.dumps(iso))
-        chunk_gdf = gpd.GeoDataFrame.from_features(output_iso["features"])
 
-        gdfs.append(chunk_gdf)
+def features_by_location(iso, keys):
+    """
+    Splits an isochrone response into the features of each requested location.
 
-    gdf = pd.concat(gdfs, ignore_index=True)
-    gdf.drop(columns=["center"], inplace=True)
+    Parameters:
+    iso (dict): The GeoJSON response for a chunk of locations.
+    keys (list): The cache keys of the locations, in request order.
 
-    return gdf
+    Returns:
+    dict: A mapping of each cache key to its list of GeoJSON features.
+    """
+    features = {key: [] for key in keys}
+    for feature in iso["features"]:
+        features[keys[feature["properties"]["group_index"]]].append(feature)
+    return features
 
 
-def create_linestring_gdf(gdf):
+def get_isochrones(coordinates, chunk_size=CHUNK_SIZE, workers=DEFAULT_WORKERS,
+                   requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, cache=None, profiles=(PROFILE,), ranges=RANGES,
+                   attributes=ATTRIBUTES, client=None, base_url=None):
     """
-    Creates a LineString GeoDataFrame from a GeoDataFrame of points.
+    Makes API requests to get isochrones for every combination of profile and range, and processes the responses.
+    Ranges share requests, up to MAX_RANGES_PER_REQUEST per request, so each profile needs one request per chunk of
+    locations. Locations already in the cache, or repeated within the coordinates, are not requested again. The
+    requests of all profiles run concurrently within a requests-per-minute budget and are retried on rate limits and
+    transient errors, and each response is cached as soon as it arrives.
 
     Parameters:
-    gdf (GeoDataFrame): The GeoDataFrame of points.
+    coordinates (list): A list of [lon, lat] coordinates.
+    chunk_size (int): The number of locations per request.
+    workers (int): The number of requests kept in flight.
+    requests_per_minute (int): The maximum number of requests started per minute.
+    cache (IsochroneCache, optional): The isochrone cache to read from and write to.
+    profiles (list): The routing profiles.
+    ranges (list): The isochrone ranges, in seconds.
+    attributes (list): The attributes to request.
+    client (Client, optional): The OpenRouteService client. Defaults to get_client().
+    base_url (str, optional): The URL of the server the client requests from, which the cached isochrones are keyed
+    by. Defaults to the public API.
 
     Returns:
-    GeoDataFrame: A GeoDataFrame containing a single LineString.
+    GeoDataFrame: A GeoDataFrame containing the isochrones, ordered by profile and then by the order of the
+    coordinates, with a profile column, a value column holding the range and a stop_index column giving the
+    position of each isochrone's coordinates.
     """
-    line_string_obj = LineString([[point.x, point.y] for point in gdf.geometry.values])
-    line_df = pd.DataFrame()
-    line_gdf = gpd.GeoDataFrame(line_df, geometry=[line_string_obj])
-    return line_gdf
+    # Each profile and group of ranges is requested and cached separately
+    range_groups = [tuple(range_group) for range_group in chunks(list(ranges), MAX_RANGES_PER_REQUEST)]
+    batches = [(profile, range_group) for profile in profiles for range_group in range_groups]
+    keys = {batch: [cache_key(location, batch[0], batch[1], attributes, base_url) for location in coordinates]
+            for batch in batches}
+    features = cache.get_many([key for batch in batches for key in keys[batch]]) if cache is not None else {}
+
+    tasks = []
+    for batch in batches:
+        locations = dict(zip(keys[batch], coordinates))
+        missing = [key for key in locations if key not in features]
+        tasks.extend((batch, chunk_keys, [locations[key] for key in chunk_keys])
+                     for chunk_keys in chunks(missing, chunk_size))
+    requested = sum(len(chunk_keys) for _, chunk_keys, _ in tasks)
+    total = sum(len(set(keys[batch])) for batch in batches)
+    print(f"Found {total - requested} of {total} unique location and profile batches in the isochrone cache, "
+          f"making {len(tasks)} requests.")
+    if tasks and client is None:
+        client = get_client()
+
+    def request_chunk(task):
+        (profile, range_group), chunk_keys, chunk_locations = task
+        iso = request_isochrones(client, chunk_locations, profile, list(range_group), attributes)
+        chunk_features = features_by_location(iso, chunk_keys)
+        if cache is not None:
+            cache.put_many(chunk_features)
+        return chunk_features
+
+    with stage('requests', requests=len(tasks)):
+        for chunk_features in run_scheduled(request_chunk, tasks, workers, requests_per_minute):
+            features.update(chunk_features)
+
+    stop_features = [dict(feature, properties=dict(feature["properties"], profile=profile, stop_index=stop_index))
+                     for profile in profiles
+                     for stop_index in range(len(coordinates))
+                     for range_group in range_groups
+                     for feature in features[keys[(profile, range_group)][stop_index]]]
+    gdf = gpd.GeoDataFrame.from_features(stop_features, crs="EPSG:4326")
+    gdf.drop(columns=["center", "group_index"], inplace=True, errors="ignore")
+
+    return gdf
+
 
-# Read the CSV files into GeoDataFrames
-shapes_gdf = read_csv_to_gdf("KMRL-Open-Data\shapes.txt", "shape_pt_lon", "shape_pt_lat")
-stops_gdf = read_csv_to_gdf("KMRL-Open-Data\stops.txt", "stop_lon", "stop_lat")
+def run_analysis(gtfs_folder, output="isochrones.gpkg", profiles=(PROFILE,), ranges=RANGES, chunk_size=CHUNK_SIZE,
+                 workers=DEFAULT_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 cache_path=DEFAULT_CACHE_PATH, api_key=None, base_url=None, backend='ors', network_path=None,
+                 network_layer=None, coverage=False):
+    """
+    Creates isochrones around the stops of a GTFS feed for every combination of profile and range, and saves them
+    as one GeoPackage layer with profile and value (range) columns. Isochrones come from the OpenRouteService API,
+    or with the local backend from a walking network computed offline.
 
-# Create a LineString GeoDataFrame from the shapes GeoDataFrame
-line_gdf = create_linestring_gdf(shapes_gdf)
+    Parameters:
+    gtfs_folder (str): The folder containing the GTFS feed's stops.txt.
+    output (str): The path of the GeoPackage to write, with the isochrones in its 'isochrones' layer and, when the
+    feed has shapes.txt, one route line per shape_id in its 'routes' layer.
+    profiles (list): The routing profiles.
+    ranges (list): The isochrone ranges, in seconds.
+    chunk_size (int): The number of stops per request.
+    workers (int): The number of requests kept in flight.
+    requests_per_minute (int): The maximum number of requests started per minute.
+    cache_path (str, optional): The path to the isochrone cache. None disables the cache.
+    api_key (str, optional): The API key. Read from creds.txt when not given and no base_url is set.
+    base_url (str, optional): The server URL, for a self-hosted or stub server.
+    backend (str): 'ors' for the OpenRouteService API or 'local' for the local network.
+    network_path (str, optional): The OSM extract or line file of the network, required by the local backend.
+    network_layer (str, optional): The layer of the network line file.
+    coverage (bool): Whether to add non-overlapping coverage: apportioned population and areas per stop, a
+    'coverage' layer of the dissolved isochrones, and a CSV of network-wide totals next to the output.
 
-# Extract the coordinates from the stops GeoDataFrame
-coordinates = stops_gdf.geometry.apply(lambda point: [point.x, point.y]).tolist()
-coordinates_chunks = list(chunks(coordinates, 5))
+    Returns:
+    GeoDataFrame: The isochrones.
+    """
+    # Read the stops into a GeoDataFrame and extract their coordinates
+    with stage('read_stops'):
+        stops_gdf = read_stops(gtfs_folder)
+    coordinates = shapely.get_coordinates(stops_gdf.geometry.values).tolist()
+
+    if backend == 'local':
+        # Imported here so the API backend does not need scipy
+        from local_isochrones import load_network, local_isochrones
+
+        if network_path is None:
+            raise ValueError("The local backend needs a network file")
+        with stage('load_network'):
+            network = load_network(network_path, network_layer)
+        with stage('local_isochrones', features=len(coordinates) * len(profiles) * len(ranges)):
+            gdf = pd.concat([local_isochrones(coordinates, network, ranges, profile).assign(profile=profile)
+                             for profile in profiles], ignore_index=True)
+    elif backend == 'ors':
+        # Get the isochrones, requesting only the stops that are not cached yet
+        client = get_client(api_key, base_url) if api_key is not None or base_url is not None else None
+        cache = IsochroneCache(cache_path) if cache_path else None
+        try:
+            gdf = get_isochrones(coordinates, chunk_size, workers, requests_per_minute, cache, profiles, ranges,
+                                 ATTRIBUTES, client, base_url)
+        finally:
+            if cache is not None:
+                cache.close()
+    else:
+        raise ValueError(f"Unknown backend {backend!r}, expected 'ors' or 'local'")
+
+    if coverage and gdf.empty:
+        print("No isochrones were created, so there is no coverage to summarize.")
+    elif coverage:
+        with stage('coverage', features=len(gdf)):
+            gdf, coverage_gdf = summarize_coverage(gdf)
+        write_vector(coverage_gdf, output, layer="coverage")
+        totals = network_totals(coverage_gdf)
+        totals.to_csv(os.path.splitext(output)[0] + "_coverage.csv", index=False)
+        print(totals.to_string(index=False))
+
+    # Save the results, with the route shapes of the feed for context
+    with stage('write', features=len(gdf)):
+        write_vector(gdf, output, layer="isochrones")
+    if os.path.exists(os.path.join(gtfs_folder, "shapes.txt")):
+        with stage('routes'):
+            write_vector(read_shapes(gtfs_folder), output, layer="routes")
+    return gdf
 
-# Get the isochrones
-gdf = get_isochrones(coordinates_chunks)
 
-# Save the results
-gdf.to_file("isochrones.gpkg", driver="GPKG")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create isochrones around the stops of a GTFS feed")
+    parser.add_argument('--gtfs_folder', type=str, default="KMRL-Open-Data", help='folder containing the GTFS feed')
+    parser.add_argument('--output', type=str, default="isochrones.gpkg", help='path of the output GeoPackage')
+    parser.add_argument('--profiles', type=str, nargs='+', default=[PROFILE], help='routing profiles to sweep, e.g. foot-walking cycling-regular')
+    parser.add_argument('--ranges', type=int, nargs='+', default=RANGES, help='isochrone ranges in seconds')
+    parser.add_argument('--chunk_size', type=int, default=CHUNK_SIZE, help='number of stops per request')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='number of requests kept in flight')
+    parser.add_argument('--requests_per_minute', type=int, default=DEFAULT_REQUESTS_PER_MINUTE, help='maximum requests started per minute, 0 for no limit')
+    parser.add_argument('--cache', type=str, default=DEFAULT_CACHE_PATH, help='path to the isochrone cache, empty to disable it')
+    parser.add_argument('--creds', type=str, default=CREDS_PATH, help='file whose first line is the API key')
+    parser.add_argument('--base_url', type=str, help='URL of a self-hosted or stub OpenRouteService server')
+    parser.add_argument('--backend', type=str, choices=['ors', 'local'], default='ors', help='ors for the OpenRouteService API, local for a local network')
+    parser.add_argument('--network', type=str, help='OSM extract (.osm/.osm.pbf) or line file of the network for the local backend')
+    parser.add_argument('--network_layer', type=str, help='layer of the network line file')
+    parser.add_argument('--coverage', action='store_true', help='add dissolved coverage, de-duplicated population and network-wide totals')
+    add_profile_argument(parser)
+    args = parser.parse_args()
+
+    api_key = read_api_key(args.creds) if os.path.exists(args.creds) else None
+    with profiling(args.profile, 'service_area_analysis'):
+        run_analysis(args.gtfs_folder, args.output, args.profiles, args.ranges, args.chunk_size, args.workers,
+                     args.requests_per_minute, args.cache or None, api_key, args.base_url, args.backend, args.network,
+                     args.network_layer, args.coverage)
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+"""
+This module turns overlapping per-stop isochrones into coverage that does not double count. For each range (and
+profile, when present), isochrones are partitioned into groups of mutually overlapping polygons with an STRtree, and
+each group is unioned separately, so the network-wide coverage is the union of small groups instead of one large
+cascade. Areas are measured in the data's UTM zone.
+
+Population is apportioned by splitting each group into the faces formed by its isochrone boundaries. Each isochrone's
+total_pop is spread over its faces by area, a face's population is the mean of the estimates of the isochrones
+covering it, and that population is shared equally among those isochrones. Each stop's apportioned_pop then counts
+only its share of the people it serves, and the apportioned populations add up to the network-wide total.
+"""
+
+SQUARE_METERS_PER_SQUARE_KM = 1_000_000
+
+
+def overlap_groups(geometries):
+    """
+    Partitions geometries into groups of transitively overlapping geometries.
+
+    Parameters:
+    geometries (ndarray): An array of shapely geometries.
+
+    Returns:
+    ndarray: The group number of each geometry.
+    """
+    pairs = shapely.STRtree(geometries).query(geometries, predicate='intersects')
+    graph = coo_matrix((np.ones(pairs.shape[1]), (pairs[0], pairs[1])), shape=(len(geometries), len(geometries)))
+    return connected_components(graph, directed=False)[1]
+
+
+def apportion_population(geometries, populations):
+    """
+    Apportions the population of overlapping isochrones so that people covered by several isochrones are counted once.
+
+    Parameters:
+    geometries (ndarray): The isochrones of one overlap group, in a projected CRS.
+    populations (ndarray): The total_pop of each isochrone.
+
+    Returns:
+    ndarray: The apportioned population of each isochrone.
+    """
+    if len(geometries) == 1:
+        return populations.astype(float)
+
+    faces = shapely.get_parts(shapely.polygonize(shapely.get_parts(shapely.union_all(shapely.boundary(geometries)))))
+    face_points = shapely.point_on_surface(faces)
+    face_index, geometry_index = shapely.STRtree(geometries).query(face_points, predicate='within')
+
+    # Each covering isochrone estimates the face's population from its own density
+    face_areas = shapely.area(faces)
+    densities = populations / shapely.area(geometries)
+    estimates = densities[geometry_index] * face_areas[face_index]
+    cover_counts = np.bincount(face_index, minlength=len(faces))
+    face_populations = np.bincount(face_index, weights=estimates, minlength=len(faces)) / np.maximum(cover_counts, 1)
+
+    # Share each face's population equally among the isochrones covering it
+    shares = face_populations[face_index] / cover_counts[face_index]
+    return np.bincount(geometry_index, weights=shares, minlength=len(geometries))
+
+
+def summarize_coverage(isochrones):
+    """
+    Computes per-stop and network-wide coverage from per-stop isochrones.
+
+    Parameters:
+    isochrones (GeoDataFrame): The isochrones, with stop_index and value columns, a profile column when several
+    profiles are present, and a total_pop column when population was requested.
+
+    Returns:
+    tuple: The isochrones with area_km2 and, when total_pop is present, apportioned_pop columns, and a GeoDataFrame
+    of the dissolved coverage of each overlap group with area_km2, stop_count and total_pop columns.
+    """
+    group_columns = [column for column in ['profile', 'value'] if column in isochrones.columns]
+    has_population = 'total_pop' in isochrones.columns
+    crs = isochrones.estimate_utm_crs()
+
+    # Duplicate ranges of a stop give identical isochrones, which are counted once
+    unique = isochrones.drop_duplicates(subset=['stop_index'] + group_columns).to_crs(crs)
+    unique = unique.assign(area_km2=unique.area / SQUARE_METERS_PER_SQUARE_KM)
+    if has_population:
+        unique['apportioned_pop'] = 0.0
+
+    coverage = []
+    for keys, range_isochrones in unique.groupby(group_columns, sort=False):
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        geometries = np.asarray(range_isochrones.geometry.array, dtype=object)
+        groups = overlap_groups(geometries)
+        for group in np.unique(groups):
+            members = np.flatnonzero(groups == group)
+            record = dict(zip(group_columns, keys))
+            record['stop_count'] = len(members)
+            if has_population:
+                populations = range_isochrones['total_pop'].to_numpy(dtype=float)[members]
+                apportioned = apportion_population(geometries[members], populations)
+                unique.loc[range_isochrones.index[members], 'apportioned_pop'] = apportioned
+                record['total_pop'] = apportioned.sum()
+            record['geometry'] = shapely.union_all(geometries[members])
+            coverage.append(record)
+
+    coverage = gpd.GeoDataFrame(coverage, geometry='geometry', crs=crs)
+    coverage.insert(len(group_columns), 'area_km2', coverage.area / SQUARE_METERS_PER_SQUARE_KM)
+
+    added_columns = ['area_km2', 'apportioned_pop'] if has_population else ['area_km2']
+    per_stop = isochrones.merge(pd.DataFrame(unique[['stop_index'] + group_columns + added_columns]),
+                                on=['stop_index'] + group_columns, how='left')
+    return per_stop, coverage.to_crs(isochrones.crs)
+
+
+def network_totals(coverage):
+    """
+    Totals the dissolved coverage of each range over the whole network.
+
+    Parameters:
+    coverage (GeoDataFrame): The dissolved coverage returned by summarize_coverage.
+
+    Returns:
+    DataFrame: The covered area in square kilometers and, when present, the de-duplicated population of each range.
+    """
+    group_columns = [column for column in ['profile', 'value'] if column in coverage.columns]
+    value_columns = [column for column in ['area_km2', 'total_pop'] if column in coverage.columns]
+    return pd.DataFrame(coverage[group_columns + value_columns]).groupby(group_columns, as_index=False).sum()
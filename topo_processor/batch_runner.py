@@ -0,0 +1,483 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from topo_processor import SLOPE_CLASS_LABELS_DICT, SLOPE_RECLASS_REMAP, list_dems
+
+
+"""
+This script runs the numpy backend of topo_processor over many projects. Projects are listed in a manifest (CSV or
+JSON) with the same fields as the topo_processor arguments: SOURCE_NAME, DEM, GDB, and optionally AOI, ZONE_FIELD,
+POLYGON_OUTPUT, CONTOUR_LINES, CONTOUR_INTERVAL1 and CONTOUR_INTERVAL2.
+
+Each project is split into steps (dem, slope, reclass, summary, polygons, contours). Steps from all projects are scheduled
+across worker processes as soon as the steps they depend on have finished. Every finished step is recorded in a
+topo_state.json file in the project's GDB folder, so a rerun skips steps whose outputs already exist and picks up
+where a failed run stopped. The state is only reused while the project settings, the size and modification time of
+every DEM tile and the slope class remap are unchanged, and --force reruns every step. Per-step timings are printed
+at the end and can be written to a CSV report.
+"""
+
+STATE_FILE = "topo_state.json"
+TRUE_VALUES = ['true', '1', 'yes']
+
+
+def is_enabled(value):
+    """
+    Checks whether a manifest flag such as POLYGON_OUTPUT is switched on.
+
+    Parameters:
+    value (str): The flag value.
+
+    Returns:
+    bool: True if the value is 'true', '1' or 'yes'.
+    """
+    return bool(value) and str(value).lower() in TRUE_VALUES
+
+
+def project_paths(project):
+    """
+    Builds the output paths of every step of a project.
+
+    Parameters:
+    project (dict): The project settings.
+
+    Returns:
+    dict: The output paths, keyed by name.
+    """
+    gdb, source_name = project['GDB'], project['SOURCE_NAME']
+    return {
+        'vrt': os.path.join(gdb, "mosaic_dem.vrt"),
+        'slope': os.path.join(gdb, f"{source_name}_Slope.tif"),
+        'reclass': os.path.join(gdb, f"{source_name}_Slope_Reclass.tif"),
+        'polygons': os.path.join(gdb, f"{source_name}_Slope_GradeClasses.gpkg"),
+        'summary': os.path.join(gdb, f"{source_name}_Slope_Class_Areas.csv"),
+        'contours': [os.path.join(gdb, f"{source_name}_contours_interval1.gpkg"),
+                     os.path.join(gdb, f"{source_name}_contours_interval2.gpkg")],
+    }
+
+
+def dem_to_process(project):
+    """
+    Gets the DEM a project reads, either its only DEM file or the virtual mosaic of its tiles.
+
+    Parameters:
+    project (dict): The project settings.
+
+    Returns:
+    str: The path to the DEM.
+    """
+    input_dems = list_dems(project['DEM'])
+    if len(input_dems) == 1 and not project.get('AOI'):
+        return input_dems[0]
+    return project_paths(project)['vrt']
+
+
+def step_dem(project, workers=1):
+    """
+    Prepares a project's DEM, building a virtual mosaic if it has several tiles or an AOI.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): Unused, kept for a common step signature.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    os.makedirs(project['GDB'], exist_ok=True)
+    input_dems = list_dems(project['DEM'])
+    if not input_dems:
+        raise FileNotFoundError(f"No DEM files found in {project['DEM']}")
+
+    dem = dem_to_process(project)
+    if dem != input_dems[0]:
+        import virtual_mosaic
+        virtual_mosaic.build_virtual_mosaic(input_dems, dem, project.get('AOI'))
+        return [dem]
+    return []
+
+
+def step_slope(project, workers=1):
+    """
+    Computes a project's percent-rise slope grid.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): The number of worker processes for the slope engine.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    import slope_engine
+
+    output = project_paths(project)['slope']
+    slope_engine.compute_slope(dem_to_process(project), output, workers=workers)
+    return [output]
+
+
+def step_reclass(project, workers=1):
+    """
+    Reclassifies a project's slope grid into slope classes.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): Unused, kept for a common step signature.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    import slope_engine
+
+    paths = project_paths(project)
+    slope_engine.reclassify_slope(paths['slope'], paths['reclass'], SLOPE_RECLASS_REMAP)
+    return [paths['reclass']]
+
+
+def step_polygons(project, workers=1):
+    """
+    Writes a project's dissolved slope class polygons.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): Unused, kept for a common step signature.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    import slope_polygons
+
+    paths = project_paths(project)
+    slope_polygons.write_slope_classes(paths['reclass'], paths['polygons'], project['SOURCE_NAME'], SLOPE_CLASS_LABELS_DICT)
+    return [paths['polygons']]
+
+
+def step_summary(project, workers=1):
+    """
+    Writes a project's per-class pixel counts and areas, per AOI feature if the project has an AOI.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): Unused, kept for a common step signature.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    import slope_engine
+
+    paths = project_paths(project)
+    summary = slope_engine.class_area_summary(paths['reclass'], SLOPE_CLASS_LABELS_DICT, project.get('AOI'), project.get('ZONE_FIELD'))
+    summary.to_csv(paths['summary'], index=False)
+    return [paths['summary']]
+
+
+def step_contours(project, workers=1):
+    """
+    Generates a project's contour lines at both intervals.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): The number of worker processes for the contour engine.
+
+    Returns:
+    list: The paths written by the step.
+    """
+    import contour_engine
+
+    intervals = [int(project['CONTOUR_INTERVAL1']), int(project['CONTOUR_INTERVAL2'])]
+    names = [f"{project['SOURCE_NAME']}_contours_interval1", f"{project['SOURCE_NAME']}_contours_interval2"]
+    return contour_engine.generate_contours(dem_to_process(project), project['GDB'], intervals, names, workers=workers)
+
+
+# Step name -> (function, names of the steps it depends on)
+STEPS = {
+    'dem': (step_dem, []),
+    'slope': (step_slope, ['dem']),
+    'reclass': (step_reclass, ['slope']),
+    'polygons': (step_polygons, ['reclass']),
+    'summary': (step_summary, ['reclass']),
+    'contours': (step_contours, ['dem']),
+}
+
+
+def project_steps(project):
+    """
+    Lists the steps a project needs, in dependency order.
+
+    Parameters:
+    project (dict): The project settings.
+
+    Returns:
+    list: The step names.
+    """
+    steps = ['dem', 'slope', 'reclass', 'summary']
+    if is_enabled(project.get('POLYGON_OUTPUT')):
+        steps.append('polygons')
+    if is_enabled(project.get('CONTOUR_LINES')):
+        steps.append('contours')
+    return steps
+
+
+def file_signature(path):
+    """
+    Describes an input file by its name, size and modification time, so a replaced file is noticed.
+
+    Parameters:
+    path (str): The path to the file.
+
+    Returns:
+    list: The file name, size in bytes and modification time.
+    """
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime]
+
+
+def state_signature(project):
+    """
+    Builds what a project's saved state must match to be reused: the project settings, the DEM tiles and AOI it
+    reads, and the slope class remap. Adding, removing or replacing a DEM tile changes the signature.
+
+    Parameters:
+    project (dict): The project settings.
+
+    Returns:
+    dict: The signature.
+    """
+    inputs = sorted(file_signature(dem) for dem in list_dems(project['DEM']))
+    aoi = project.get('AOI')
+    return {
+        'project': project,
+        'dems': inputs,
+        'aoi': file_signature(aoi) if aoi and os.path.isfile(aoi) else None,
+        'remap': SLOPE_RECLASS_REMAP,
+    }
+
+
+def load_state(project, force=False):
+    """
+    Loads the checkpoint state of a project. State saved for different project settings, DEM tiles or remap is
+    ignored.
+
+    Parameters:
+    project (dict): The project settings.
+    force (bool): Whether to ignore the saved state and rerun every step.
+
+    Returns:
+    dict: The state, with the project signature and a 'steps' mapping of finished steps.
+    """
+    signature = state_signature(project)
+    state_path = os.path.join(project['GDB'], STATE_FILE)
+    if os.path.exists(state_path) and not force:
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get('signature') == json.loads(json.dumps(signature)):
+            return state
+    return {'signature': signature, 'steps': {}}
+
+
+def save_state(project, state):
+    """
+    Saves the checkpoint state of a project, replacing the state file atomically.
+
+    Parameters:
+    project (dict): The project settings.
+    state (dict): The state to save.
+    """
+    os.makedirs(project['GDB'], exist_ok=True)
+    state_path = os.path.join(project['GDB'], STATE_FILE)
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+
+def completed_steps(project, state):
+    """
+    Finds the steps that finished in an earlier run, still have their outputs, and only depend on steps that are
+    themselves complete. Anything downstream of a step that must rerun is rerun too.
+
+    Parameters:
+    project (dict): The project settings.
+    state (dict): The project state.
+
+    Returns:
+    set: The names of the steps that can be skipped.
+    """
+    complete = set()
+    for step in project_steps(project):
+        record = state['steps'].get(step)
+        if record is None or not all(os.path.exists(path) for path in record['outputs']):
+            continue
+        if set(STEPS[step][1]) <= complete:
+            complete.add(step)
+    return complete
+
+
+def clear_stale_steps(project, state, complete):
+    """
+    Removes the records of every step that will rerun and saves the state. Every step downstream of a rerun step
+    reruns too, so no record built from an earlier run of a step can outlive that step's new outputs, even if the
+    run stops partway through.
+
+    Parameters:
+    project (dict): The project settings.
+    state (dict): The project state.
+    complete (set): The names of the steps that can be skipped, as returned by completed_steps.
+    """
+    state['steps'] = {step: record for step, record in state['steps'].items() if step in complete}
+    save_state(project, state)
+
+
+def run_step(project, step, workers=1):
+    """
+    Runs one step of a project and times it. Runs in a worker process when scheduled by run_batch.
+
+    Parameters:
+    project (dict): The project settings.
+    step (str): The step name.
+    workers (int): The number of worker processes the step may use itself.
+
+    Returns:
+    dict: The step record with its outputs and run time in seconds.
+    """
+    start = time.perf_counter()
+    outputs = STEPS[step][0](project, workers)
+    return {'outputs': outputs, 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def run_project(project, workers=1, force=False):
+    """
+    Runs the steps of one project in order in this process, skipping steps finished in an earlier run.
+
+    Parameters:
+    project (dict): The project settings.
+    workers (int): The number of worker processes each step may use.
+    force (bool): Whether to rerun steps finished in an earlier run.
+
+    Returns:
+    dict: The step records of the project.
+    """
+    state = load_state(project, force)
+    complete = completed_steps(project, state)
+    clear_stale_steps(project, state, complete)
+    for step in project_steps(project):
+        if step in complete:
+            print(f"{project['SOURCE_NAME']}: {step} already complete, skipping")
+            continue
+        state['steps'][step] = run_step(project, step, workers)
+        save_state(project, state)
+        print(f"{project['SOURCE_NAME']}: {step} finished in {state['steps'][step]['seconds']}s")
+    return state['steps']
+
+
+def read_manifest(manifest_path):
+    """
+    Reads the projects from a CSV or JSON manifest.
+
+    Parameters:
+    manifest_path (str): The path to the manifest.
+
+    Returns:
+    list: The project settings dictionaries.
+    """
+    with open(manifest_path, newline='') as f:
+        if manifest_path.endswith('.json'):
+            projects = json.load(f)
+        else:
+            projects = list(csv.DictReader(f))
+    return [{key: value for key, value in project.items() if value not in (None, '')} for project in projects]
+
+
+def run_batch(projects, jobs=None, force=False):
+    """
+    Schedules the steps of many projects across worker processes, starting each step once its dependencies are done.
+    A failed step is reported and its dependent steps are skipped, while other projects carry on.
+
+    Parameters:
+    projects (list): The project settings dictionaries.
+    jobs (int, optional): The number of worker processes. Defaults to the number of CPUs.
+    force (bool): Whether to rerun steps finished in an earlier run.
+
+    Returns:
+    list: (project name, step, status, seconds) tuples for every step.
+    """
+    states = [load_state(project, force) for project in projects]
+    pending = {(index, step) for index, project in enumerate(projects) for step in project_steps(project)}
+    finished, failed, report = set(), set(), []
+
+    for index, project in enumerate(projects):
+        complete = completed_steps(project, states[index])
+        clear_stale_steps(project, states[index], complete)
+        for step in sorted(complete):
+            finished.add((index, step))
+            report.append((project['SOURCE_NAME'], step, 'skipped', states[index]['steps'][step]['seconds']))
+    pending -= finished
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        while pending or running:
+            for index, step in sorted(pending):
+                dependencies = {(index, dependency) for dependency in STEPS[step][1]}
+                if dependencies & failed:
+                    pending.discard((index, step))
+                    failed.add((index, step))
+                    report.append((projects[index]['SOURCE_NAME'], step, 'not run', None))
+                elif dependencies <= finished:
+                    pending.discard((index, step))
+                    running[executor.submit(run_step, projects[index], step)] = (index, step)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, step = running.pop(future)
+                name = projects[index]['SOURCE_NAME']
+                try:
+                    record = future.result()
+                except Exception as e:
+                    print(f"{name}: {step} failed: {e}")
+                    failed.add((index, step))
+                    report.append((name, step, 'failed', None))
+                    continue
+                states[index]['steps'][step] = record
+                save_state(projects[index], states[index])
+                finished.add((index, step))
+                report.append((name, step, 'done', record['seconds']))
+                print(f"{name}: {step} finished in {record['seconds']}s")
+
+    return report
+
+
+def main(manifest, jobs=None, report=None, force=False):
+    """
+    Main function that runs every project in a manifest and reports the step timings.
+
+    Parameters:
+    manifest (str): The path to the CSV or JSON manifest.
+    jobs (int, optional): The number of worker processes.
+    report (str, optional): A CSV file to write the step timings to.
+    force (bool): Whether to rerun steps finished in an earlier run.
+    """
+    projects = read_manifest(manifest)
+    results = run_batch(projects, jobs, force)
+
+    print(f"{'project':<30}{'step':<12}{'status':<10}seconds")
+    for name, step, status, seconds in results:
+        print(f"{name:<30}{step:<12}{status:<10}{'' if seconds is None else seconds}")
+
+    if report:
+        with open(report, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['project', 'step', 'status', 'seconds'])
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the topo_processor numpy backend over a manifest of projects.")
+    parser.add_argument('manifest', metavar='manifest', type=str, help='CSV or JSON manifest of projects')
+    parser.add_argument('--jobs', metavar='jobs', type=int, default=None, help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--report', metavar='report', type=str, help='optional CSV file for per-step timings')
+    parser.add_argument('--force', action='store_true', help='rerun every step, ignoring steps finished in an earlier run')
+    args = parser.parse_args()
+    main(args.manifest, args.jobs, args.report, args.force)
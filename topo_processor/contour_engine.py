@@ -0,0 +1,169 @@
+import os
+import numpy as np
+import rasterio
+import shapely
+import geopandas as gpd
+from osgeo import gdal, ogr
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+This module generates contour lines from a DEM with GDAL's contouring algorithm, without arcpy. The DEM is split
+into tiles that share one row and column of cells with their neighbours, each tile is converted to the output
+units once and contoured at every requested interval in a single pass, and tiles run in parallel worker
+processes. Because neighbouring tiles share their edge cells, contour segments end at identical points on the
+seams, where they are merged back into continuous lines.
+"""
+
+METERS_TO_FEET = 3.281
+DEFAULT_TILE_SIZE = 2048
+CONTOUR_NODATA = -9999.0
+
+
+def iter_tiles(width, height, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Yield tile windows covering a raster, each overlapping its right and bottom neighbours by one cell.
+
+    Parameters:
+    width (int): The raster width in cells.
+    height (int): The raster height in cells.
+    tile_size (int): The tile size in cells, not counting the overlap.
+
+    Returns:
+    generator: A generator that yields Windows.
+    """
+    for row_off in range(0, height - 1, tile_size):
+        for col_off in range(0, width - 1, tile_size):
+            yield Window(col_off, row_off, min(tile_size + 1, width - col_off), min(tile_size + 1, height - row_off))
+
+
+def _memory_layer():
+    """
+    Creates an in-memory OGR line layer with ID and ELEV fields for GDAL to write contours to.
+
+    Returns:
+    tuple: The data source, which must be kept alive, and the layer.
+    """
+    driver = ogr.GetDriverByName('Memory') or ogr.GetDriverByName('MEM')
+    data_source = driver.CreateDataSource('contours')
+    layer = data_source.CreateLayer('contours', geom_type=ogr.wkbLineString)
+    layer.CreateField(ogr.FieldDefn('ID', ogr.OFTInteger))
+    layer.CreateField(ogr.FieldDefn('ELEV', ogr.OFTReal))
+    return data_source, layer
+
+
+def _contour_tile(dem_path, window, intervals, z_factor):
+    """
+    Contours one tile of a DEM at several intervals. Runs in a worker process.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    window (Window): The tile to contour.
+    intervals (list): The contour intervals, in output units.
+    z_factor (float): The factor converting DEM elevations to output units.
+
+    Returns:
+    list: (interval, elevation, WKB geometry) tuples for every contour segment in the tile.
+    """
+    with rasterio.open(dem_path) as src:
+        elevations = src.read(1, window=window, masked=True).astype(np.float32)
+        geotransform = src.window_transform(window).to_gdal()
+
+    elevations = (elevations * z_factor).filled(CONTOUR_NODATA)
+    if (elevations == CONTOUR_NODATA).all():
+        return []
+
+    raster = gdal.GetDriverByName('MEM').Create('', elevations.shape[1], elevations.shape[0], 1, gdal.GDT_Float32)
+    raster.SetGeoTransform(geotransform)
+    band = raster.GetRasterBand(1)
+    band.WriteArray(elevations)
+    band.SetNoDataValue(CONTOUR_NODATA)
+
+    segments = []
+    for interval in intervals:
+        data_source, layer = _memory_layer()
+        gdal.ContourGenerateEx(band, layer, options=[
+            f"LEVEL_INTERVAL={interval}",
+            "LEVEL_BASE=0",
+            "ID_FIELD=0",
+            "ELEV_FIELD=1",
+            f"NODATA={CONTOUR_NODATA}",
+        ])
+        for feature in layer:
+            segments.append((interval, feature.GetField('ELEV'), bytes(feature.GetGeometryRef().ExportToWkb())))
+        data_source = None
+
+    raster = None
+    return segments
+
+
+def stitch_segments(segments, grid_size):
+    """
+    Merges contour segments cut at tile seams into continuous lines, one feature per interval and elevation.
+
+    Parameters:
+    segments (list): (interval, elevation, WKB geometry) tuples.
+    grid_size (float): The precision grid that segment end points are snapped to before merging.
+
+    Returns:
+    dict: A mapping of interval to a list of (elevation, merged geometry) tuples.
+    """
+    grouped = {}
+    for interval, elevation, wkb in segments:
+        grouped.setdefault((interval, elevation), []).append(wkb)
+
+    stitched = {}
+    for (interval, elevation), wkbs in sorted(grouped.items()):
+        lines = shapely.set_precision(shapely.from_wkb(wkbs), grid_size)
+        merged = shapely.line_merge(shapely.multilinestrings(lines[~shapely.is_empty(lines)]))
+        stitched.setdefault(interval, []).append((elevation, merged))
+    return stitched
+
+
+def generate_contours(dem_path, output_directory, intervals, contour_names, z_factor=METERS_TO_FEET,
+                      tile_size=DEFAULT_TILE_SIZE, workers=1):
+    """
+    Generates contour lines at several intervals in one tiled pass over a DEM and writes one GeoPackage per interval.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    output_directory (str): The directory where the output will be saved.
+    intervals (list): The contour intervals, in output units.
+    contour_names (list): The output name for each interval.
+    z_factor (float): The factor converting DEM elevations to output units. Defaults to meters to feet.
+    tile_size (int): The tile size in cells.
+    workers (int): The number of worker processes. 1 contours in this process.
+
+    Returns:
+    list: The paths to the generated contour files.
+    """
+    with rasterio.open(dem_path) as src:
+        crs = src.crs
+        grid_size = min(abs(src.transform.a), abs(src.transform.e)) / 1000
+        tiles = list(iter_tiles(src.width, src.height, tile_size))
+
+    unique_intervals = list(dict.fromkeys(intervals))
+    tasks = ([dem_path] * len(tiles), tiles, [unique_intervals] * len(tiles), [z_factor] * len(tiles))
+    segments = []
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for tile_segments in executor.map(_contour_tile, *tasks):
+                segments.extend(tile_segments)
+    else:
+        for tile_segments in map(_contour_tile, *tasks):
+            segments.extend(tile_segments)
+
+    stitched = stitch_segments(segments, grid_size)
+
+    output_paths = []
+    for interval, contour_name in zip(intervals, contour_names):
+        contours = stitched.get(interval, [])
+        gdf = gpd.GeoDataFrame({'Contour': [elevation for elevation, _ in contours]},
+                               geometry=[geometry for _, geometry in contours], crs=crs)
+        gdf = gdf.explode(index_parts=False, ignore_index=True)
+        out_contour = os.path.join(output_directory, f"{contour_name}.gpkg")
+        gdf.to_file(out_contour, driver='GPKG')
+        output_paths.append(out_contour)
+
+    return output_paths
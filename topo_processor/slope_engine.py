@@ -0,0 +1,377 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.windows import Window
+from concurrent.futures import ProcessPoolExecutor
+
+
+"""
+This module computes slope and aspect from a DEM and reclassifies slope grids with NumPy and rasterio, so the
+topo_processor workflow can run on machines without ArcGIS Pro. The DEM is processed in block windows that
+overlap their neighbours by one cell (a halo), which keeps memory flat for large DEMs and lets windows be
+computed in parallel worker processes. Results are written as tiled, compressed GeoTIFFs. Per-class areas are
+counted straight from the reclassified grid, optionally per AOI zone.
+
+Slope and aspect follow the ArcGIS planar method (Horn, 1981). As in ArcGIS, a NoData neighbour, or a
+neighbour beyond the raster edge, takes the value of the center cell. Elevations are taken to be in meters, like the
+METER z unit the arcpy backend passes to Slope, so a DEM in a foot-based CRS gets the matching z-factor.
+"""
+
+DEFAULT_BLOCK_SIZE = 1024
+SLOPE_NODATA = -9999.0
+RECLASS_NODATA = 0
+GTIFF_OPTIONS = {
+    'driver': 'GTiff',
+    'tiled': True,
+    'blockxsize': 256,
+    'blockysize': 256,
+    'compress': 'deflate',
+    'BIGTIFF': 'IF_SAFER',
+}
+SQUARE_METERS_PER_ACRE = 4046.8564224
+SQUARE_METERS_PER_HECTARE = 10000.0
+
+
+def parse_remap(remap):
+    """
+    Parses an ArcGIS remap string like "0 3 1;3 5 2" into range bounds and new values.
+
+    Parameters:
+    remap (str): Semicolon-separated "lower upper new_value" ranges in ascending order.
+
+    Returns:
+    tuple: Arrays of lower bounds, upper bounds and new values.
+    """
+    ranges = np.array([[float(part) for part in entry.split()] for entry in remap.split(';')])
+    return ranges[:, 0], ranges[:, 1], ranges[:, 2].astype(np.int64)
+
+
+def iter_windows(width, height, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Yield block_size windows covering a raster.
+
+    Parameters:
+    width (int): The raster width in cells.
+    height (int): The raster height in cells.
+    block_size (int): The window size in cells.
+
+    Returns:
+    generator: A generator that yields Windows.
+    """
+    for row_off in range(0, height, block_size):
+        for col_off in range(0, width, block_size):
+            yield Window(col_off, row_off, min(block_size, width - col_off), min(block_size, height - row_off))
+
+
+def read_with_halo(src, window, halo=1):
+    """
+    Reads a window plus a halo of surrounding cells as float64, with NaN for NoData and for cells beyond the edge.
+
+    Parameters:
+    src (DatasetReader): The open raster.
+    window (Window): The window to read.
+    halo (int): The number of cells to add on each side.
+
+    Returns:
+    ndarray: An array of shape (window.height + 2 * halo, window.width + 2 * halo).
+    """
+    col_start = max(window.col_off - halo, 0)
+    row_start = max(window.row_off - halo, 0)
+    col_stop = min(window.col_off + window.width + halo, src.width)
+    row_stop = min(window.row_off + window.height + halo, src.height)
+    block = src.read(1, window=Window(col_start, row_start, col_stop - col_start, row_stop - row_start), masked=True)
+    block = block.astype(np.float64).filled(np.nan)
+
+    pad_width = (
+        (row_start - (window.row_off - halo), window.row_off + window.height + halo - row_stop),
+        (col_start - (window.col_off - halo), window.col_off + window.width + halo - col_stop),
+    )
+    return np.pad(block, pad_width, constant_values=np.nan)
+
+
+def horn_differences(z):
+    """
+    Computes the Horn weighted differences in the x and y directions for every interior cell of an array.
+
+    Parameters:
+    z (ndarray): Elevations with a one-cell halo, NaN for NoData.
+
+    Returns:
+    tuple: The x and y differences, not yet divided by the cell size, and the center cell values.
+    """
+    e = z[1:-1, 1:-1]
+    a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+    d, f = z[1:-1, :-2], z[1:-1, 2:]
+    g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+    a, b, c, d, f, g, h, i = (np.where(np.isnan(n), e, n) for n in (a, b, c, d, f, g, h, i))
+
+    dx = ((c + 2 * f + i) - (a + 2 * d + g)) / 8
+    dy = ((g + 2 * h + i) - (a + 2 * b + c)) / 8
+    return dx, dy, e
+
+
+def slope_percent(z, cellsize_x, cellsize_y, z_factor=1.0):
+    """
+    Computes percent-rise slope for the interior cells of an array.
+
+    Parameters:
+    z (ndarray): Elevations with a one-cell halo, NaN for NoData.
+    cellsize_x (float): The cell width in the same units as the elevations.
+    cellsize_y (float): The cell height in the same units as the elevations.
+    z_factor (float): The factor converting elevation units to horizontal units.
+
+    Returns:
+    ndarray: Percent-rise slope, NaN where the center cell is NoData.
+    """
+    dx, dy, center = horn_differences(z * z_factor)
+    slope = np.hypot(dx / cellsize_x, dy / cellsize_y) * 100
+    slope[np.isnan(center)] = np.nan
+    return slope
+
+
+def aspect_degrees(z):
+    """
+    Computes aspect in degrees clockwise from north for the interior cells of an array. Flat cells are -1.
+
+    Parameters:
+    z (ndarray): Elevations with a one-cell halo, NaN for NoData.
+
+    Returns:
+    ndarray: Aspect in degrees, NaN where the center cell is NoData.
+    """
+    dx, dy, center = horn_differences(z)
+    angle = np.degrees(np.arctan2(dy, -dx))
+    aspect = np.where(angle < 0, 90 - angle, np.where(angle > 90, 450 - angle, 90 - angle))
+    aspect[(dx == 0) & (dy == 0)] = -1
+    aspect[np.isnan(center)] = np.nan
+    return aspect
+
+
+def _surface_window(dem_path, window, surface, z_factor):
+    """
+    Computes slope or aspect for one window of a DEM. Runs in a worker process.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    window (Window): The window to compute.
+    surface (str): Either 'slope' or 'aspect'.
+    z_factor (float): The factor converting elevation units to horizontal units.
+
+    Returns:
+    tuple: The window and the computed float32 array, with SLOPE_NODATA for NoData.
+    """
+    with rasterio.open(dem_path) as src:
+        z = read_with_halo(src, window)
+        if surface == 'slope':
+            result = slope_percent(z, abs(src.transform.a), abs(src.transform.e), z_factor)
+        else:
+            result = aspect_degrees(z)
+    return window, np.nan_to_num(result, nan=SLOPE_NODATA).astype(np.float32)
+
+
+def elevation_z_factor(src):
+    """
+    Gets the z-factor converting elevations in meters to the linear units of a raster's CRS.
+
+    Parameters:
+    src (DatasetReader): The open DEM.
+
+    Returns:
+    float: The z-factor, 1 for a CRS in meters.
+    """
+    return 1.0 / src.crs.linear_units_factor[1]
+
+
+def _compute_surface(dem_path, output_path, surface, z_factor, block_size, workers):
+    """
+    Computes slope or aspect over a whole DEM window by window and writes it to a GeoTIFF.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    output_path (str): The path of the GeoTIFF to write.
+    surface (str): Either 'slope' or 'aspect'.
+    z_factor (float, optional): The factor converting elevation units to horizontal units. Defaults to the factor for
+    elevations in meters, from the DEM's CRS.
+    block_size (int): The window size in cells.
+    workers (int): The number of worker processes. 1 computes in this process.
+
+    Returns:
+    str: The path to the written GeoTIFF.
+    """
+    with rasterio.open(dem_path) as src:
+        if src.crs is not None and src.crs.is_geographic:
+            raise ValueError(f"The DEM must be in a projected coordinate system: {dem_path}")
+        if z_factor is None:
+            z_factor = elevation_z_factor(src) if src.crs is not None else 1.0
+        profile = src.profile.copy()
+        windows = list(iter_windows(src.width, src.height, block_size))
+
+    profile.update(GTIFF_OPTIONS, count=1, dtype='float32', nodata=SLOPE_NODATA, predictor=3)
+    tasks = ([dem_path] * len(windows), windows, [surface] * len(windows), [z_factor] * len(windows))
+
+    with rasterio.open(output_path, 'w', **profile) as dst:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for window, result in executor.map(_surface_window, *tasks):
+                    dst.write(result, 1, window=window)
+        else:
+            for window, result in map(_surface_window, *tasks):
+                dst.write(result, 1, window=window)
+
+    return output_path
+
+
+def compute_slope(dem_path, output_path, z_factor=None, block_size=DEFAULT_BLOCK_SIZE, workers=1):
+    """
+    Computes percent-rise slope from a DEM and writes it to a tiled, compressed GeoTIFF.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    output_path (str): The path of the slope GeoTIFF to write.
+    z_factor (float, optional): The factor converting elevation units to horizontal units. Defaults to the factor for
+    elevations in meters, from the DEM's CRS.
+    block_size (int): The window size in cells.
+    workers (int): The number of worker processes.
+
+    Returns:
+    str: The path to the slope GeoTIFF.
+    """
+    return _compute_surface(dem_path, output_path, 'slope', z_factor, block_size, workers)
+
+
+def compute_aspect(dem_path, output_path, block_size=DEFAULT_BLOCK_SIZE, workers=1):
+    """
+    Computes aspect from a DEM and writes it to a tiled, compressed GeoTIFF. Flat cells are -1.
+
+    Parameters:
+    dem_path (str): The path to the DEM.
+    output_path (str): The path of the aspect GeoTIFF to write.
+    block_size (int): The window size in cells.
+    workers (int): The number of worker processes.
+
+    Returns:
+    str: The path to the aspect GeoTIFF.
+    """
+    return _compute_surface(dem_path, output_path, 'aspect', 1.0, block_size, workers)
+
+
+def reclassify_values(values, lowers, uppers, new_values):
+    """
+    Reclassifies values into ranges. Upper bounds are inclusive, and the lower bound of the first range is
+    inclusive, so a value on a boundary goes to the lower class as with ArcGIS Reclassify.
+
+    Parameters:
+    values (ndarray): The values to reclassify, NaN for NoData.
+    lowers (ndarray): The lower bound of each range.
+    uppers (ndarray): The upper bound of each range.
+    new_values (ndarray): The new value of each range.
+
+    Returns:
+    ndarray: The new values, RECLASS_NODATA for NoData and values outside every range.
+    """
+    indices = np.digitize(values, uppers, right=True)
+    inside = indices < len(uppers)
+    indices = np.minimum(indices, len(uppers) - 1)
+    inside &= (values > lowers[indices]) | ((indices == 0) & (values == lowers[0]))
+    return np.where(inside, new_values[indices], RECLASS_NODATA)
+
+
+def reclassify_slope(slope_path, output_path, remap, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Reclassifies a slope grid with an ArcGIS remap string and writes it to a tiled, compressed GeoTIFF.
+
+    Parameters:
+    slope_path (str): The path to the slope GeoTIFF.
+    output_path (str): The path of the reclassified GeoTIFF to write.
+    remap (str): The remap string, like "0 3 1;3 5 2".
+    block_size (int): The window size in cells.
+
+    Returns:
+    str: The path to the reclassified GeoTIFF.
+    """
+    lowers, uppers, new_values = parse_remap(remap)
+    dtype = 'uint8' if new_values.max() <= np.iinfo(np.uint8).max else 'int32'
+
+    with rasterio.open(slope_path) as src:
+        profile = src.profile.copy()
+        profile.update(GTIFF_OPTIONS, count=1, dtype=dtype, nodata=RECLASS_NODATA, predictor=2)
+        with rasterio.open(output_path, 'w', **profile) as dst:
+            for window in iter_windows(src.width, src.height, block_size):
+                values = src.read(1, window=window, masked=True).astype(np.float64).filled(np.nan)
+                dst.write(reclassify_values(values, lowers, uppers, new_values).astype(dtype), 1, window=window)
+
+    return output_path
+
+
+def cell_area_square_meters(src):
+    """
+    Gets the area of one cell of a raster in square meters, using the linear units of its CRS.
+
+    Parameters:
+    src (DatasetReader): The open raster.
+
+    Returns:
+    float: The cell area in square meters.
+    """
+    if src.crs is None or src.crs.is_geographic:
+        raise ValueError(f"The raster must be in a projected coordinate system: {src.name}")
+    meters_per_unit = src.crs.linear_units_factor[1]
+    transform = src.transform
+    return abs(transform.a * transform.e - transform.b * transform.d) * meters_per_unit ** 2
+
+
+def class_area_summary(reclass_path, slope_class_labels, zones_path=None, zone_field=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Counts the cells of each slope class in a reclassified grid, optionally per zone, with one bincount per block,
+    and converts the counts to acres and hectares. Where zones overlap, cells count toward the later zone.
+
+    Parameters:
+    reclass_path (str): The path to the reclassified slope grid.
+    slope_class_labels (dict): A dictionary mapping slope classes to labels.
+    zones_path (str, optional): A polygon layer whose features are summarized separately.
+    zone_field (str, optional): The zone attribute used to label rows. Defaults to the feature index.
+    block_size (int): The block size in cells.
+
+    Returns:
+    DataFrame: One row per class (and zone) with pixel counts, acres and hectares.
+    """
+    with rasterio.open(reclass_path) as src:
+        if np.dtype(src.dtypes[0]).itemsize > 2:
+            raise ValueError(f"Class areas need an 8 or 16 bit reclassified grid: {reclass_path}")
+        class_slots = int(np.iinfo(src.dtypes[0]).max) + 1
+        cell_area = cell_area_square_meters(src)
+        nodata = RECLASS_NODATA if src.nodata is None else src.nodata
+
+        zones = None
+        zone_count = 1
+        if zones_path:
+            zones = gpd.read_file(zones_path).to_crs(src.crs)
+            zone_count = len(zones) + 1  # zone 0 collects cells outside every zone
+
+        counts = np.zeros(zone_count * class_slots, dtype=np.int64)
+        for window in iter_windows(src.width, src.height, block_size):
+            classes = src.read(1, window=window).astype(np.int64)
+            if zones is None:
+                codes = classes
+            else:
+                block_zones = rasterize(((geometry, index + 1) for index, geometry in enumerate(zones.geometry)),
+                                        out_shape=classes.shape, transform=src.window_transform(window),
+                                        fill=0, dtype='int32')
+                codes = block_zones.astype(np.int64) * class_slots + classes
+            counts += np.bincount(codes[classes != nodata].ravel(), minlength=counts.size)
+
+    zone_index, gridcode = np.divmod(np.flatnonzero(counts), class_slots)
+    summary = pd.DataFrame({'GRIDCODE': gridcode, 'pixel_count': counts[counts > 0]})
+    summary.insert(1, 'Label', summary['GRIDCODE'].map(slope_class_labels))
+    square_meters = summary['pixel_count'] * cell_area
+    summary['area_acres'] = (square_meters / SQUARE_METERS_PER_ACRE).round(2)
+    summary['area_hectares'] = (square_meters / SQUARE_METERS_PER_HECTARE).round(2)
+
+    if zones is not None:
+        zone_ids = np.asarray(zones[zone_field] if zone_field else zones.index, dtype=object)
+        summary.insert(0, 'zone', [zone_ids[index - 1] if index > 0 else None for index in zone_index])
+        summary = summary[zone_index > 0].reset_index(drop=True)
+
+    return summary
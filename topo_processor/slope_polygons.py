@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+import shapely
+from affine import Affine
+from rasterio.features import shapes
+from shapely import affinity
+from shapely.geometry import shape
+
+from slope_engine import DEFAULT_BLOCK_SIZE, RECLASS_NODATA, iter_windows
+
+
+"""
+This module turns a reclassified slope grid into dissolved slope class polygons without arcpy. Each block of the
+grid is polygonized in pixel coordinates, so pieces of a class that meet at block seams share exactly the same
+integer vertices and are dissolved by a single union per class. The dissolved classes are then moved to map
+coordinates, labelled, and written with the GT10 subset and one layer per class to a single GeoPackage.
+"""
+
+GT10_CLASSES = [5, 6, 7]
+
+
+def polygonize_classes(reclass_path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Polygonizes a reclassified grid block by block and dissolves the polygons of each class.
+
+    Parameters:
+    reclass_path (str): The path to the reclassified slope grid.
+    block_size (int): The block size in cells.
+
+    Returns:
+    GeoDataFrame: One multipolygon per class with a GRIDCODE column, in the grid's CRS.
+    """
+    pieces = {}
+    with rasterio.open(reclass_path) as src:
+        nodata = RECLASS_NODATA if src.nodata is None else src.nodata
+        for window in iter_windows(src.width, src.height, block_size):
+            block = src.read(1, window=window)
+            pixel_transform = Affine.translation(window.col_off, window.row_off)
+            for geometry, value in shapes(block, mask=block != nodata, transform=pixel_transform):
+                pieces.setdefault(int(value), []).append(shape(geometry))
+        a, b, c, d, e, f = src.transform[:6]
+        crs = src.crs
+
+    gridcodes = sorted(pieces)
+    dissolved = [shapely.union_all(pieces[gridcode]) for gridcode in gridcodes]
+    dissolved = [affinity.affine_transform(geometry, [a, b, d, e, c, f]) for geometry in dissolved]
+    return gpd.GeoDataFrame({'GRIDCODE': np.array(gridcodes, dtype=np.int32)}, geometry=dissolved, crs=crs)
+
+
+def write_slope_classes(reclass_path, output_path, source_name, slope_class_labels, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Polygonizes and dissolves a reclassified slope grid and writes the dissolved classes, the GT10 subset and one
+    layer per class to a GeoPackage.
+
+    Parameters:
+    reclass_path (str): The path to the reclassified slope grid.
+    output_path (str): The path of the GeoPackage to write.
+    source_name (str): The name of the data source, used for the dissolved layer name.
+    slope_class_labels (dict): A dictionary mapping slope classes to labels.
+    block_size (int): The block size in cells.
+
+    Returns:
+    str: The path to the GeoPackage.
+    """
+    classes = polygonize_classes(reclass_path, block_size)
+    classes.insert(0, 'Label', pd.Categorical(classes['GRIDCODE'].map(slope_class_labels)))
+
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+    layers = {f"{source_name}_Slope_GradeClasses_Dissolved": classes}
+    layers['GT10'] = classes[classes['GRIDCODE'].isin(GT10_CLASSES)]
+    for label, class_gdf in classes.groupby('Label', observed=True):
+        layers[label] = class_gdf
+
+    for layer, gdf in layers.items():
+        gdf = gdf.astype({'Label': str})
+        gdf.to_file(output_path, layer=layer, driver='GPKG')
+
+    return output_path
@@ -1,6 +1,10 @@
-import arcpy
-from arcpy.sa import Raster, Slope, Aspect  # Add other tools as needed
-import arcpy.ia
+try:
+    import arcpy
+    from arcpy.sa import Raster, Slope, Aspect  # Add other tools as needed
+    import arcpy.ia
+except ImportError:
+    # The numpy backend runs without ArcGIS Pro
+    arcpy = None
 import argparse
 import os
 
@@ -11,30 +15,43 @@ Users provide input parameters such as user details, project folder, data source
 and output folder. It includes functions for geodatabase creation, DEM preparation, slope calculation, reclassification, 
 field joining, raster-to-polygon conversion, and polygon manipulation. Users can choose to generate contour lines and 
 polygons.
+
+Slope and reclassification can run either through arcpy (the default) or through the NumPy/rasterio engine in
+slope_engine.py with --BACKEND numpy, which needs no ArcGIS license and writes tiled GeoTIFFs to the GDB folder.
 """
 
-USER = arcpy.GetParameterAsText(0)
-PROJECT_FOLDER = arcpy.GetParameterAsText(1)
-SOURCE_NAME = arcpy.GetParameterAsText(2)
-SOURCE_DATE = arcpy.GetParameterAsText(3)
-DEM = arcpy.GetParameterAsText(4)
-PROJECTION = arcpy.GetParameterAsText(5)
-POLYGON_OUTPUT = arcpy.GetParameterAsText(6) 
-CONTOUR_LINES = arcpy.GetParameterAsText(7) 
-CONTOUR_INTERVAL1= arcpy.GetParameterAsText(8) 
-CONTOUR_INTERVAL2 = arcpy.GetParameterAsText(9) 
 SLOPE_CLASS_LABELS_DICT = {
     1: 'LTE3',
     2: 'GT3_LTE5',
     3: 'GT5_LTE7',
     4: 'GT7_LTE10',
-    5: 'GT10_LTE15'
+    5: 'GT10_LTE15',
+    6: 'GT15_LTE20',
+    7: 'GT20'
 }
+SLOPE_RECLASS_REMAP = "0 3 1;3 5 2;5 7 3;7 10 4;10 15 5;15 20 6;20 999.999990 7"
+
+
+def configure_arcpy():
+    """
+    Sets up the arcpy environment, extensions and toolboxes used by the arcpy backend.
+    """
+    arcpy.env.overwriteOutput = True
+    arcpy.CheckOutExtension("3D")
+    arcpy.CheckOutExtension("spatial")
+    arcpy.ImportToolbox(r"c:\program files\arcgis\pro\Resources\ArcToolbox\toolboxes\Analysis Tools.tbx")
 
-arcpy.env.overwriteOutput = True
-arcpy.CheckOutExtension("3D")
-arcpy.CheckOutExtension("spatial")
-arcpy.ImportToolbox(r"c:\program files\arcgis\pro\Resources\ArcToolbox\toolboxes\Analysis Tools.tbx")
+
+def log_message(message):
+    """
+    Prints a message and, when running inside ArcGIS, adds it to the tool messages.
+
+    Parameters:
+    message (str): The message to report.
+    """
+    print(message)
+    if arcpy is not None:
+        arcpy.AddMessage(message)
 
 
 def create_file_geodatabase(USER, PROJECT_FOLDER, topo_gdb_name):
@@ -64,35 +81,57 @@ def create_file_geodatabase(USER, PROJECT_FOLDER, topo_gdb_name):
     return TopoGDB
 
 
-def prepare_dem(dem_directory, output_directory, PROJECTION):
+def list_dems(dem_directory):
+    """
+    Lists the DEM GeoTIFFs in a directory.
+
+    Parameters:
+    dem_directory (str): The directory containing the DEM files.
+
+    Returns:
+    list: The paths to the DEM files.
+    """
+    return [os.path.join(dem_directory, file) for file in os.listdir(dem_directory) if file.endswith(".tif")]
+
+
+def prepare_dem(dem_directory, output_directory, PROJECTION, AOI=None):
     """
-    Prepares the DEM by creating a mosaic if there are multiple DEM files.
+    Prepares the DEM by creating a mosaic dataset if there are multiple DEM files. A mosaic dataset only
+    references the source tiles, so no copy of the DEM is written. If an AOI is given, the processing
+    extent is set to it so later tools only read the part of the DEM they need.
 
     Parameters:
     dem_directory (str): The directory containing the DEM files.
     output_directory (str): The directory where the output will be saved.
     PROJECTION (str): The expected projection of the DEM.
+    AOI (str, optional): The path to a project AOI feature class or shapefile.
 
     Returns:
     str: The path to the DEM to be processed.
     """
     # Create a list of all input DEM files
-    input_dems = [os.path.join(dem_directory, file) for file in os.listdir(dem_directory) if file.endswith(".tif")]
+    input_dems = list_dems(dem_directory)
 
     print(f"Input DEMs: {input_dems}")  # Print the list of input DEM files
     arcpy.AddMessage(f"Input DEMs: {input_dems}")
 
     # Check the number of DEM files
     if len(input_dems) > 1:
-        # If there's more than one DEM file, create a mosaic
+        # If there's more than one DEM file, create a mosaic dataset referencing the tiles
         mosaic_dem = "mosaic_dem"
         dem_to_process = os.path.join(output_directory, mosaic_dem)
-        arcpy.CreateRasterDataset_management(out_path=output_directory, out_name=mosaic_dem, pixel_type="32_BIT_FLOAT")
-        arcpy.Mosaic_management(inputs=";".join(input_dems), target=dem_to_process)
+        spatial_reference = arcpy.Describe(input_dems[0]).spatialReference
+        arcpy.management.CreateMosaicDataset(in_workspace=output_directory, in_mosaicdataset_name=mosaic_dem, coordinate_system=spatial_reference, num_bands=1, pixel_type="32_BIT_FLOAT")
+        arcpy.management.AddRastersToMosaicDataset(in_mosaic_dataset=dem_to_process, raster_type="Raster Dataset", input_path=input_dems)
     else:
         # If there's only one DEM file, use it directly
         dem_to_process = input_dems[0]
 
+    if AOI:
+        # Limit processing to the AOI extent instead of clipping a copy of the DEM
+        arcpy.env.extent = AOI
+        arcpy.AddMessage(f"Processing extent set to AOI: {AOI}")
+
     print(f"DEM to process: {dem_to_process}")  # Print the path to the DEM to be processed
     arcpy.AddMessage(f"DEM to process: {dem_to_process}")
 
@@ -138,7 +177,7 @@ def reclassify(SlopePercentGrid, FILE_OUTPUT):
     str: The path to the reclassified slope grid.
     """
     # Reclassify = ReclassedSlopeGrid
-    ReclassedSlopeGrid = arcpy.sa.Reclassify(SlopePercentGrid, "VALUE", "0 3 1;3 5 2;5 7 3;7 10 4;10 15 5;15 20 6;20 999.999990 7", "DATA")
+    ReclassedSlopeGrid = arcpy.sa.Reclassify(SlopePercentGrid, "VALUE", SLOPE_RECLASS_REMAP, "DATA")
     ReclassedSlopeGrid.save(FILE_OUTPUT)
     return FILE_OUTPUT
 
@@ -252,13 +291,51 @@ def generate_contours(dem, output_directory, contour_interval, contour_name):
     return out_contour
 
 
-def main(USER, PROJECT_FOLDER, SOURCE_NAME, SOURCE_DATE, DEM, PROJECTION, GDB, POLYGON_OUTPUT, CONTOUR_LINES, CONTOUR_INTERVAL1, CONTOUR_INTERVAL2):
-    
+def main_numpy(SOURCE_NAME, DEM, GDB, POLYGON_OUTPUT, CONTOUR_LINES, CONTOUR_INTERVAL1, CONTOUR_INTERVAL2, WORKERS, AOI=None, ZONE_FIELD=None, FORCE=False):
+    """
+    Runs the slope workflow with the NumPy/rasterio engine, writing GeoTIFFs to the GDB folder. Steps that
+    finished in an earlier run with the same settings and DEM tiles are skipped unless FORCE is set.
+
+    Parameters:
+    SOURCE_NAME (str): The name of the data source.
+    DEM (str): The directory containing the DEM file.
+    GDB (str): The output folder, created if it does not exist.
+    POLYGON_OUTPUT (str): Whether polygon output was requested.
+    CONTOUR_LINES (str): Whether contour lines were requested.
+    CONTOUR_INTERVAL1 (str): The first contour interval, in feet.
+    CONTOUR_INTERVAL2 (str): The second contour interval, in feet.
+    WORKERS (int): The number of worker processes.
+    AOI (str, optional): The path to a project AOI layer to crop the DEM to. Class areas are summarized per AOI feature.
+    ZONE_FIELD (str, optional): The AOI attribute used to label the class area rows.
+    FORCE (bool): Whether to rerun steps finished in an earlier run.
+
+    Returns:
+    str: The path to the reclassified slope grid.
+    """
+    # Imported here so the arcpy backend does not need rasterio or the GDAL bindings
+    import batch_runner
+
+    project = {'SOURCE_NAME': SOURCE_NAME, 'DEM': DEM, 'GDB': GDB, 'AOI': AOI, 'ZONE_FIELD': ZONE_FIELD, 'POLYGON_OUTPUT': POLYGON_OUTPUT,
+               'CONTOUR_LINES': CONTOUR_LINES, 'CONTOUR_INTERVAL1': CONTOUR_INTERVAL1, 'CONTOUR_INTERVAL2': CONTOUR_INTERVAL2}
+    project = {key: value for key, value in project.items() if value not in (None, '')}
+    batch_runner.run_project(project, WORKERS, FORCE)
+    log_message(f"Outputs written to {GDB}")
+
+    return batch_runner.project_paths(project)['reclass']
+
+
+def main(USER, PROJECT_FOLDER, SOURCE_NAME, SOURCE_DATE, DEM, PROJECTION, GDB, POLYGON_OUTPUT, CONTOUR_LINES, CONTOUR_INTERVAL1, CONTOUR_INTERVAL2, BACKEND='arcpy', WORKERS=1, AOI=None, ZONE_FIELD=None, FORCE=False):
     
+    if BACKEND == 'numpy':
+        return main_numpy(SOURCE_NAME, DEM, GDB, POLYGON_OUTPUT, CONTOUR_LINES, CONTOUR_INTERVAL1, CONTOUR_INTERVAL2, WORKERS, AOI, ZONE_FIELD, FORCE)
+    if arcpy is None:
+        raise RuntimeError("arcpy is not available, use --BACKEND numpy to run without ArcGIS Pro")
+    configure_arcpy()
+
     topo_gdb_name = f"Topo_{SOURCE_NAME}_{SOURCE_DATE}"
     topo_gdb = create_file_geodatabase(USER, PROJECT_FOLDER, topo_gdb_name)
 
-    dem_to_process = prepare_dem(DEM, topo_gdb, PROJECTION)
+    dem_to_process = prepare_dem(DEM, topo_gdb, PROJECTION, AOI)
 
     slope_percent_grid = fr"{topo_gdb}\{SOURCE_NAME}_Slope"
     SlopePercentGrid = process_slope(dem_to_process, slope_percent_grid)
@@ -300,5 +377,10 @@ if __name__ == "__main__":
     parser.add_argument('--CONTOUR_LINES', metavar='CONTOUR_LINES', type=str, help='allows option of creating contours from raster output - default 3 and 5 feet')
     parser.add_argument('--CONTOUR_INTERVAL1', metavar='CONTOUR_INTERVAL1', type=str, help='select contour interval - like 3 and 5 (will be in feet)')
     parser.add_argument('--CONTOUR_INTERVAL2', metavar='CONTOUR_INTERVAL2', type=str, help='select contour interval - like 3 and 5 (will be in feet)')
+    parser.add_argument('--BACKEND', metavar='BACKEND', type=str, choices=['arcpy', 'numpy'], default='arcpy', help='arcpy (default) or numpy, which runs without ArcGIS Pro and writes GeoTIFFs to GDB')
+    parser.add_argument('--WORKERS', metavar='WORKERS', type=int, default=1, help='worker processes for the numpy backend')
+    parser.add_argument('--AOI', metavar='AOI', type=str, help='optional project AOI, processing is limited to its extent')
+    parser.add_argument('--ZONE_FIELD', metavar='ZONE_FIELD', type=str, help='AOI attribute labelling the per-zone slope class areas (numpy backend)')
+    parser.add_argument('--FORCE', action='store_true', help='rerun every step of the numpy backend, ignoring steps finished in an earlier run')
     args = parser.parse_args()
-    main(args.USER, args.PROJECT_FOLDER, args.SOURCE_NAME, args.SOURCE_DATE, args.DEM, args.PROJECTION, args.GDB, args.POLYGON_OUTPUT, args.CONTOUR_LINES, args.CONTOUR_INTERVAL1, args.CONTOUR_INTERVAL2)
+    main(args.USER, args.PROJECT_FOLDER, args.SOURCE_NAME, args.SOURCE_DATE, args.DEM, args.PROJECTION, args.GDB, args.POLYGON_OUTPUT, args.CONTOUR_LINES, args.CONTOUR_INTERVAL1, args.CONTOUR_INTERVAL2, args.BACKEND, args.WORKERS, args.AOI, args.ZONE_FIELD, args.FORCE)
@@ -0,0 +1,53 @@
+import geopandas as gpd
+import rasterio
+from osgeo import gdal
+
+
+"""
+This module builds a GDAL virtual raster (VRT) over a folder of DEM tiles for the numpy backend. The VRT is a small
+XML file that references the source tiles, so slope, reclassification and contouring read the tiles on demand
+instead of waiting for a full mosaic copy to be written. The VRT can be cropped to the extent of a project AOI.
+"""
+
+
+def aoi_bounds(aoi_path, raster_path):
+    """
+    Gets the bounds of an AOI layer in the coordinate system of a raster.
+
+    Parameters:
+    aoi_path (str): The path to the AOI layer.
+    raster_path (str): The path to the raster.
+
+    Returns:
+    tuple: The (minx, miny, maxx, maxy) bounds of the AOI.
+    """
+    with rasterio.open(raster_path) as src:
+        raster_crs = src.crs
+    aoi = gpd.read_file(aoi_path)
+    if raster_crs is not None:
+        aoi = aoi.to_crs(raster_crs)
+    return tuple(aoi.total_bounds)
+
+
+def build_virtual_mosaic(input_dems, vrt_path, aoi_path=None):
+    """
+    Builds a VRT mosaic of DEM tiles, optionally cropped to the extent of an AOI.
+
+    Parameters:
+    input_dems (list): The paths to the DEM tiles.
+    vrt_path (str): The path of the VRT to write.
+    aoi_path (str, optional): The path to an AOI layer to crop the mosaic to.
+
+    Returns:
+    str: The path to the VRT.
+    """
+    options = {}
+    if aoi_path:
+        options['outputBounds'] = aoi_bounds(aoi_path, input_dems[0])
+
+    vrt = gdal.BuildVRT(vrt_path, input_dems, **options)
+    if vrt is None:
+        raise RuntimeError(f"Failed to build a virtual mosaic at {vrt_path}")
+    vrt = None
+
+    return vrt_path